@@ -0,0 +1,100 @@
+"""Generate synthetic tldr-pages trees for benchmarking.
+
+The layout matches the tldr repository and release archive:
+pages.<language>/<platform>/<command>.md
+"""
+
+import random
+import zipfile
+from pathlib import Path
+
+WORDS = (
+    "archive file directory list copy move remove show print display create "
+    "extract compress network process user group permission recursive verbose "
+    "output input path format search pattern match replace count sort unique "
+    "download upload server client connect port address interface package "
+    "install update upgrade config system service log status kill signal"
+).split()
+
+PLATFORMS = ["common", "linux", "osx", "windows", "android", "freebsd"]
+LANGUAGES = ["en", "de", "es", "fr", "it", "ja", "pt_BR", "zh"]
+
+
+def make_command_name(rng):
+    parts = [rng.choice(WORDS)[: rng.randint(2, 6)] for _ in range(rng.randint(1, 3))]
+    return "-".join(parts)
+
+
+def make_page(rng, command, examples=8):
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+    lines = [
+        f"# {command}",
+        "",
+        f"> {sentence(8)}.",
+        f"> More information: <https://example.com/{command}>.",
+        "",
+    ]
+    for _ in range(examples):
+        flag = rng.choice(WORDS)
+        lines += [
+            f"- {sentence(6)}:",
+            "",
+            f"`{command} {{{{[-{flag[0]}|--{flag}]}}}} {{{{path/to/{rng.choice(WORDS)}}}}}`",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def generate_pages(
+    commands=1000, languages=1, platforms=2, translated=0.5, seed=0
+):
+    """Yield (relative path, page text) for a synthetic corpus.
+
+    `commands` pages are spread over the platforms for English, every other
+    language gets a `translated` fraction of them.
+    """
+    rng = random.Random(seed)
+
+    names = set()
+    while len(names) < commands:
+        names.add(make_command_name(rng))
+    names = sorted(names)
+
+    plats = PLATFORMS[:platforms]
+    placement = {name: rng.choice(plats) for name in names}
+
+    for lang in LANGUAGES[:languages]:
+        for name in names:
+            if lang != "en" and rng.random() > translated:
+                continue
+            yield (
+                f"pages.{lang}/{placement[name]}/{name}.md",
+                make_page(rng, name),
+            )
+
+
+def write_tree(root, **kwargs):
+    root = Path(root)
+    for path, text in generate_pages(**kwargs):
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(text, encoding="utf-8")
+    return root
+
+
+def write_zip(path, modified=0.0, **kwargs):
+    """Write the corpus as a release archive.
+
+    A `modified` fraction of the pages gets an extra example, to stand in
+    for the next release of the same corpus.
+    """
+    rng = random.Random(kwargs.get("seed", 0) + 1)
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, text in generate_pages(**kwargs):
+            if rng.random() < modified:
+                text += f"\n\n- Print the version:\n\n`{Path(name).stem} --version`\n"
+            archive.writestr(name, text)
+    return path
@@ -0,0 +1,242 @@
+"""Benchmark index building, loading, search and page parsing.
+
+Run from the repository root:
+
+    python -m benchmarks.run --commands 5000 --languages 4 --output results.json
+
+Results are written as JSON so runs on different commits can be compared.
+"""
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import corpus
+from src.commandindex import CommandIndex
+from src.core import PageLibrary
+from src.indexer import StreamSource
+from src.parser import format_command, parse_page
+from src.search import SearchEngine
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "min_ms": timings[0],
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max_ms": timings[-1],
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_generate_index(work_dir, options, corpus_args):
+    tree = corpus.write_tree(work_dir / "tree", **corpus_args)
+
+    def run():
+        subprocess.run(
+            [sys.executable, str(REPO_DIR / "generate_commands_index.py")],
+            cwd=tree,
+            check=True,
+            capture_output=True,
+        )
+
+    return measure(run, options.repeat), tree
+
+
+def make_system_dir(tree, target, manifest):
+    """Copy the index files of tree, like the ones the flatpak ships.
+
+    Without a manifest nothing counts as unchanged, so an install indexes
+    every page.
+    """
+    target.mkdir()
+    names = ["commands.bin", "pages.pack", "search.json"]
+    if manifest:
+        names.append("manifest.json")
+    for name in names:
+        shutil.copy(tree / name, target / name)
+    return target
+
+
+def bench_process_zip(work_dir, options, archive, system_dir, name="cache"):
+    cache_dir = work_dir / name
+
+    def run():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cache_dir.mkdir()
+        library = PageLibrary(system_dir, cache_dir)
+        shutil.copy(archive, library.zip_path)
+        library.process_tldr_zip()
+
+    return measure(run, options.repeat)
+
+
+def bench_stream_zip(work_dir, options, archive, system_dir):
+    """Index the archive from 64 KiB chunks, like a cache update does."""
+    cache_dir = work_dir / "stream-cache"
+
+    def chunks():
+        with open(archive, "rb") as f:
+            while chunk := f.read(64 * 1024):
+                yield chunk
+
+    def run():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cache_dir.mkdir()
+        PageLibrary(system_dir, cache_dir).install_pages(StreamSource(chunks()))
+
+    return measure(run, options.repeat)
+
+
+def bench_search(library, languages, queries):
+    commands = [
+        (cmd, plat, lang)
+        for lang, plat in sorted(library.get_slices(languages, corpus.PLATFORMS))
+        for cmd in library.get_commands(lang, plat)
+    ]
+
+    engine = SearchEngine(library.get_fulltext_index)
+    engine.set_commands(commands)
+
+    # the first query builds the name index, it is reported separately
+    start = time.perf_counter()
+    engine.search(queries[0][:1])
+    first_query = (time.perf_counter() - start) * 1000
+
+    # every query is typed into an empty query cache, prefixes shared with
+    # earlier queries would be cache hits otherwise
+    keystrokes = []
+    for query in queries:
+        engine.query_cache.clear()
+        for end in range(1, len(query) + 1):
+            start = time.perf_counter()
+            engine.search(query[:end])
+            keystrokes.append((time.perf_counter() - start) * 1000)
+
+    fulltext = []
+    for query in queries:
+        engine.query_cache.clear()
+        start = time.perf_counter()
+        engine.search(query, fulltext=True)
+        fulltext.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "rows": len(commands),
+        "first_query_ms": first_query,
+        "keystroke": summarize(keystrokes),
+        "fulltext_query": summarize(fulltext),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--languages", type=int, default=2)
+    parser.add_argument("--platforms", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    options = parser.parse_args()
+
+    corpus_args = {
+        "commands": options.commands,
+        "languages": options.languages,
+        "platforms": options.platforms,
+        "seed": options.seed,
+    }
+    languages = corpus.LANGUAGES[: options.languages]
+    results = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "corpus": corpus_args,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+
+        results["generate_commands_index"], tree = bench_generate_index(
+            work_dir, options, corpus_args
+        )
+        # full builds, the system data has no manifest to compare against
+        archive = corpus.write_zip(work_dir / "tldr.zip", **corpus_args)
+        system_dir = make_system_dir(tree, work_dir / "system", manifest=False)
+        results["process_tldr_zip"] = bench_process_zip(
+            work_dir, options, archive, system_dir
+        )
+        results["stream_tldr_zip"] = bench_stream_zip(
+            work_dir, options, archive, system_dir
+        )
+
+        # the next release of the same corpus, only changed pages are indexed
+        next_archive = corpus.write_zip(
+            work_dir / "tldr-next.zip", modified=0.05, **corpus_args
+        )
+        results["process_tldr_zip_delta"] = bench_process_zip(
+            work_dir, options, next_archive, tree, name="delta-cache"
+        )
+
+        results["load_command_index"] = measure(
+            lambda: CommandIndex(tree / "commands.bin").get_languages(), 20
+        )
+
+        library = PageLibrary(tree, work_dir / "empty-cache")
+        rng = random.Random(options.seed)
+        names = library.get_commands("en", "common")
+        queries = [rng.choice(names) for _ in range(20)]
+        results["search"] = bench_search(library, languages, queries)
+
+        pages = [library.get_page("en", "common", name) for name in queries]
+        results["parse_page"] = measure(lambda: [parse_page(p) for p in pages], 20)
+
+        code_lines = [
+            line[1:-1]
+            for page in pages
+            for line in page.splitlines()
+            if line.startswith("`")
+        ]
+        results["format_command"] = measure(
+            lambda: [format_command(line, "short") for line in code_lines], 20
+        )
+
+    output = json.dumps(results, indent=2)
+    if options.output:
+        Path(options.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,24 @@
-import json
-from collections import defaultdict
+import importlib
+import sys
 from pathlib import Path
 
-# {language: {platform: [commands...]}}
-commands = defaultdict(lambda: defaultdict(list))
+# The indexing code is shared with the app. The flatpak build copies src/
+# next to this script as brief/, a source checkout has it under src/.
+script_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(script_dir))
+package = "brief" if (script_dir / "brief").is_dir() else "src"
+indexer = importlib.import_module(f"{package}.indexer")
 
-base_path = Path(".")
 
-for dir in base_path.iterdir():
-    if dir.is_dir() and dir.name.startswith("pages."):
-        lang = dir.name.split(".", 1)[1]
+def main():
+    base_path = Path(".")
 
-        for platform_dir in dir.iterdir():
-            if platform_dir.is_dir():
-                platform = platform_dir.name
+    # pages are tokenized in batches on one worker process per core
+    indexer.build_index(indexer.TreeSource(base_path), base_path)
 
-                for md_file in platform_dir.glob("*.md"):
-                    command = md_file.stem
-                    commands[lang][platform].append(command)
+    print("Saved commands.bin, pages.pack, search.json and manifest.json")
 
-(base_path / "commands.json").write_text(
-    json.dumps(commands, indent=2), encoding="utf-8"
-)
 
-print("Saved commands.json")
+# the worker processes import this file again, they must not rerun the build
+if __name__ == "__main__":
+    main()
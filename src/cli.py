@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from .core import PageLibrary
+from .parser import page_to_text
+
+def get_library():
+    # same locations the app uses, without going through GLib
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return PageLibrary(Path("/app/share/tldr/"), Path(cache_home) / "brief")
+
+
+def positive_int(text):
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def parse_args(args):
+    # brief.in looks for these options by their full name before anything
+    # is imported, keep its list in sync
+    parser = argparse.ArgumentParser(
+        prog="brief",
+        description="Search and print tldr pages without the GUI.",
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--query",
+        action="append",
+        default=[],
+        help="search commands, '-' reads one query per line from stdin",
+    )
+    parser.add_argument("--page", help="print the page of a command")
+    parser.add_argument(
+        "--language", action="append", help="language code, repeatable (default: en)"
+    )
+    parser.add_argument(
+        "--platform",
+        action="append",
+        help="platform, repeatable (default: common and linux)",
+    )
+    parser.add_argument("--format", choices=["long", "short"], default="long")
+    parser.add_argument(
+        "--fulltext", action="store_true", help="search page contents"
+    )
+    parser.add_argument(
+        "--limit", type=positive_int, default=10, help="results per query"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print one JSON object per query"
+    )
+    options = parser.parse_args(args)
+    if not options.query and not options.page:
+        parser.error("one of --query or --page is required")
+    return options
+
+
+def iter_queries(queries):
+    for query in queries:
+        if query == "-":
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        else:
+            yield query
+
+
+def print_results(library, options):
+    out = sys.stdout
+
+    for query in iter_queries(options.query):
+        results = library.search(
+            query,
+            options.language,
+            options.platform,
+            fulltext=options.fulltext,
+            limit=options.limit,
+        )
+
+        if options.json:
+            out.write(
+                json.dumps(
+                    {
+                        "query": query,
+                        "results": [
+                            {"name": name, "platform": plat, "language": lang}
+                            for name, plat, lang in results
+                        ],
+                    }
+                )
+                + "\n"
+            )
+        else:
+            for name, plat, lang in results:
+                out.write(f"{query}\t{name}\t{plat}\t{lang}\n")
+
+
+def print_page(library, options):
+    # first match in the order the languages and platforms were given
+    resolved = library.resolve_page(options.page, options.language, options.platform)
+
+    if resolved is None:
+        print(f"brief: no page for '{options.page}'", file=sys.stderr)
+        return 1
+
+    page = library.get_parsed_page(*resolved, options.page)
+    print(page_to_text(page, options.format))
+    return 0
+
+
+def main(args):
+    options = parse_args(args)
+    options.language = options.language or ["en"]
+    options.platform = options.platform or ["common", "linux"]
+
+    library = get_library()
+
+    if options.query:
+        print_results(library, options)
+
+    if options.page:
+        return print_page(library, options)
+
+    return 0
@@ -0,0 +1,173 @@
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+
+# Layout, all integers are little endian uint32:
+#
+#   header          magic, string count, slice count
+#   slice table     (language id, platform id, first name, name count) per slice
+#   string offsets  string count + 1 offsets into the string data
+#   name ids        string ids of the commands, grouped by slice
+#   availability    string count + 1 offsets into the positions below
+#   positions       positions in name ids, grouped by command string id
+#   string data     utf-8 encoded strings, interned
+#
+# The availability table answers "which languages and platforms have this
+# command" without scanning any slice.
+MAGIC = b"BRIEFIX2"
+HEADER = struct.Struct("<8sII")
+SLICE = struct.Struct("<IIII")
+
+
+def write_command_index(path, commands):
+    """Write {language: {platform: [commands...]}} as a compact binary index."""
+    strings = {}
+
+    def intern(text):
+        return strings.setdefault(text, len(strings))
+
+    slices = []
+    name_ids = array("I")
+    for lang, platforms in commands.items():
+        for platform, cmd_list in platforms.items():
+            slices.append((intern(lang), intern(platform), len(name_ids), len(cmd_list)))
+            name_ids.extend(intern(cmd) for cmd in cmd_list)
+
+    offsets = array("I", [0])
+    data = bytearray()
+    for text in strings:
+        data += text.encode("utf-8")
+        offsets.append(len(data))
+
+    occurrences = [[] for _string in strings]
+    for position, name_id in enumerate(name_ids):
+        occurrences[name_id].append(position)
+
+    availability = array("I", [0])
+    positions = array("I")
+    for command_positions in occurrences:
+        positions.extend(command_positions)
+        availability.append(len(positions))
+
+    if name_ids.itemsize != 4 or offsets.itemsize != 4:
+        raise RuntimeError("array('I') is not 32 bits wide on this platform")
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(strings), len(slices)))
+        for entry in slices:
+            f.write(SLICE.pack(*entry))
+        f.write(offsets.tobytes())
+        f.write(name_ids.tobytes())
+        f.write(availability.tobytes())
+        f.write(positions.tobytes())
+        f.write(data)
+
+
+def is_command_index(path):
+    """Check for an index in the current format, older caches fail this."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class CommandIndex:
+    """Memory-mapped reader for files written by write_command_index.
+
+    Only the slice table is read up front, command names are decoded when
+    the slice for their language and platform is asked for.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n_strings, n_slices = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a command index")
+
+        view = memoryview(self.buffer)
+        pos = HEADER.size
+
+        slice_table = view[pos : pos + n_slices * SLICE.size].cast("I")
+        pos += n_slices * SLICE.size
+
+        self.offsets = view[pos : pos + (n_strings + 1) * 4].cast("I")
+        pos += (n_strings + 1) * 4
+
+        n_names = sum(slice_table[i * 4 + 3] for i in range(n_slices))
+        self.name_ids = view[pos : pos + n_names * 4].cast("I")
+        pos += n_names * 4
+
+        self.availability = view[pos : pos + (n_strings + 1) * 4].cast("I")
+        pos += (n_strings + 1) * 4
+
+        self.positions = view[pos : pos + n_names * 4].cast("I")
+        pos += n_names * 4
+
+        self.data_start = pos
+        self.n_strings = n_strings
+        self.strings = {}
+        # {string: string id}, built on the first availability lookup
+        self.string_ids = None
+
+        # {language: {platform: (first name, name count)}}
+        self.slices = {}
+        # first positions of the non-empty slices and their (language,
+        # platform), to map a position back to its slice
+        self.slice_starts = []
+        self.slice_keys = []
+        for i in range(n_slices):
+            lang_id, plat_id, start, count = slice_table[i * 4 : i * 4 + 4]
+            lang, platform = self.get_string(lang_id), self.get_string(plat_id)
+            self.slices.setdefault(lang, {})[platform] = (start, count)
+            if count:
+                self.slice_starts.append(start)
+                self.slice_keys.append((lang, platform))
+
+    def get_string(self, string_id):
+        text = self.strings.get(string_id)
+        if text is None:
+            start = self.data_start + self.offsets[string_id]
+            end = self.data_start + self.offsets[string_id + 1]
+            text = self.strings[string_id] = self.buffer[start:end].decode("utf-8")
+        return text
+
+    def get_languages(self):
+        return list(self.slices)
+
+    def get_platforms(self, lang):
+        return list(self.slices.get(lang, {}))
+
+    def has_slice(self, lang, platform):
+        return platform in self.slices.get(lang, {})
+
+    def get_commands(self, lang, platform):
+        start, count = self.slices[lang][platform]
+        return [self.get_string(i) for i in self.name_ids[start : start + count]]
+
+    def get_availability(self, command):
+        """Return {(language, platform): position} for every page of command."""
+        if self.string_ids is None:
+            self.string_ids = {
+                self.get_string(string_id): string_id
+                for string_id in range(self.n_strings)
+            }
+
+        string_id = self.string_ids.get(command)
+        if string_id is None:
+            return {}
+
+        positions = self.positions[
+            self.availability[string_id] : self.availability[string_id + 1]
+        ]
+        return {
+            self.slice_keys[bisect_right(self.slice_starts, position) - 1]: position
+            for position in positions
+        }
+
+    def find(self, lang, platform, command):
+        """Return the position of a command in the index, or None."""
+        return self.get_availability(command).get((lang, platform))
@@ -0,0 +1,165 @@
+import weakref
+from array import array
+from itertools import accumulate, compress
+
+import gi
+
+from . import instrument
+
+gi.require_version("Gtk", "4.0")
+
+from gi.repository import Gio, GObject
+
+
+class CommandItem(GObject.Object):
+    __gtype_name__ = "CommandItem"
+
+    name = GObject.Property(type=str)
+    platform = GObject.Property(type=str)
+    language = GObject.Property(type=str)
+
+    def __init__(self, name, platform, language):
+        super().__init__()
+        self.name = name
+        self.platform = platform
+        self.language = language
+
+
+class CommandListModel(GObject.Object, Gio.ListModel):
+    """List model backed by parallel arrays of interned string ids.
+
+    Rows are only wrapped in a CommandItem when the view asks for them, and
+    the wrapper lives as long as something (usually a bound list row)
+    holds on to it. `order` holds the rows currently shown, in display
+    order, and is replaced wholesale by search results.
+    """
+
+    __gtype_name__ = "CommandListModel"
+
+    def __init__(self):
+        super().__init__()
+
+        self.strings = []
+        self.string_ids = {}
+
+        self.names = array("I")
+        self.platforms = array("I")
+        self.languages = array("I")
+
+        # None shows every row in row order
+        self.order = None
+        self.items = weakref.WeakValueDictionary()
+
+    def intern(self, text):
+        string_id = self.string_ids.get(text)
+        if string_id is None:
+            string_id = self.string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def set_commands(self, commands, order=None):
+        """Replace the rows with (name, platform, language) tuples."""
+        removed = self.do_get_n_items()
+
+        self.names = array("I", (self.intern(name) for name, _plat, _lang in commands))
+        self.platforms = array("I", (self.intern(plat) for _name, plat, _lang in commands))
+        self.languages = array("I", (self.intern(lang) for _name, _plat, lang in commands))
+        self.order = None if order is None else array("I", order)
+        self.items = weakref.WeakValueDictionary()
+
+        self.items_changed(0, removed, self.do_get_n_items())
+
+    def splice(self, removed, commands):
+        """Drop the rows in removed, a sorted list, and append commands.
+
+        Later rows move up to close the gaps, items already handed out move
+        with their row. Only the span from the first to the last removed
+        position and the appended rows are reported as changed. Appended
+        rows only show up in a search order once it is set again.
+        """
+        keep = bytearray(b"\x01") * len(self.names)
+        for row in removed:
+            keep[row] = 0
+        # one past the new row of every kept row
+        new_rows = list(accumulate(keep))
+
+        if self.order is None:
+            positions = removed
+        else:
+            positions = [
+                position for position, row in enumerate(self.order) if not keep[row]
+            ]
+            self.order = array(
+                "I", (new_rows[row] - 1 for row in self.order if keep[row])
+            )
+
+        self.names = array("I", compress(self.names, keep))
+        self.platforms = array("I", compress(self.platforms, keep))
+        self.languages = array("I", compress(self.languages, keep))
+        self.items = weakref.WeakValueDictionary(
+            {new_rows[row] - 1: item for row, item in self.items.items() if keep[row]}
+        )
+
+        if positions:
+            span = positions[-1] - positions[0] + 1
+            self.items_changed(positions[0], span, span - len(positions))
+
+        position = len(self.names)
+        self.names.extend(self.intern(name) for name, _plat, _lang in commands)
+        self.platforms.extend(self.intern(plat) for _name, plat, _lang in commands)
+        self.languages.extend(self.intern(lang) for _name, _plat, lang in commands)
+
+        if self.order is None and commands:
+            self.items_changed(position, 0, len(commands))
+
+    def restore(self, strings, names, platforms, languages):
+        """Take columns of string ids as they were saved, see warmstart.py."""
+        removed = self.do_get_n_items()
+
+        self.strings = strings
+        self.string_ids = {text: string_id for string_id, text in enumerate(strings)}
+        self.names = names
+        self.platforms = platforms
+        self.languages = languages
+        self.order = None
+        self.items = weakref.WeakValueDictionary()
+
+        self.items_changed(0, removed, self.do_get_n_items())
+
+    def set_order(self, order):
+        removed = self.do_get_n_items()
+        self.order = None if order is None else array("I", order)
+        self.items_changed(0, removed, self.do_get_n_items())
+
+    def extend_order(self, rows):
+        """Append rows to the shown ones, rows already shown stay bound."""
+        position = self.do_get_n_items()
+        self.order.extend(rows)
+        self.items_changed(position, 0, len(rows))
+
+    def get_row(self, row):
+        return (
+            self.strings[self.names[row]],
+            self.strings[self.platforms[row]],
+            self.strings[self.languages[row]],
+        )
+
+    def get_row_at(self, position):
+        return position if self.order is None else self.order[position]
+
+    def do_get_item_type(self):
+        return CommandItem.__gtype__
+
+    def do_get_n_items(self):
+        return len(self.names) if self.order is None else len(self.order)
+
+    def do_get_item(self, position):
+        if position >= self.do_get_n_items():
+            return None
+
+        row = self.get_row_at(position)
+        item = self.items.get(row)
+        if item is None:
+            instrument.count("list.items_created")
+            item = self.items[row] = CommandItem(*self.get_row(row))
+        return item
@@ -0,0 +1,212 @@
+import os
+import shutil
+import tempfile
+import weakref
+from functools import lru_cache
+from pathlib import Path
+
+from . import instrument
+from .commandindex import is_command_index
+from .parser import parse_page
+from .search import SearchEngine
+from .snapshot import DataSnapshot
+
+
+def pick_page(available, languages, platforms):
+    """Return the first (language, platform) in available, or None.
+
+    The languages and platforms are tried in order, then English and
+    common as fallbacks.
+    """
+    for lang in [*languages, "en"]:
+        for plat in [*platforms, "common"]:
+            if (lang, plat) in available:
+                return lang, plat
+
+    return None
+
+
+class PageLibrary:
+    """Index loading, search, page lookup and cache installs without GTK.
+
+    The app's PageManager builds on this, the command line mode uses it
+    directly.
+    """
+
+    def __init__(self, system_data_dir, cache_dir):
+        self.system_data_dir = system_data_dir
+        self.cache_dir = cache_dir
+        # a symlink to the snapshot in use under snapshots_dir
+        self.local_data_dir = self.cache_dir / "tldr"
+        self.snapshots_dir = self.cache_dir / "snapshots"
+        self.zip_path = self.cache_dir / "tldr.zip"
+
+        # {"added": [...], "removed": [...], "modified": [...]} of
+        # (language, platform, command) keys, None if the update had nothing
+        # to compare against
+        self.last_update_diff = None
+        # the DataSnapshot being served, replaced as a whole by updates
+        self.snapshot = None
+
+        # shared with the app's sidebar, which sets rows of its own
+        self.search_engine = SearchEngine(self.get_fulltext_index)
+        # sorted (language, platform) pairs of search_commands
+        self.search_slices = None
+        # the rows search() last gave the engine
+        self.search_commands = None
+
+    def get_data_dir(self):
+        return (
+            self.local_data_dir
+            if is_command_index(self.local_data_dir / "commands.bin")
+            else self.system_data_dir
+        )
+
+    def get_snapshot(self):
+        # readers that need several files take the snapshot once, so an
+        # update in between can not mix old and new data
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self.snapshot = DataSnapshot(self.get_data_dir().resolve(), 0)
+        return snapshot
+
+    def get_command_index(self):
+        return self.get_snapshot().get_command_index()
+
+    def get_page_store(self):
+        return self.get_snapshot().get_page_store()
+
+    def get_fulltext_index(self):
+        return self.get_snapshot().get_fulltext_index()
+
+    def get_manifest(self):
+        return self.get_snapshot().get_manifest()
+
+    def get_slices(self, languages, platforms):
+        """Return the (language, platform) pairs that exist in the data."""
+        index = self.get_command_index()
+
+        return {
+            (lang, plat)
+            for lang in languages
+            for plat in platforms
+            if index.has_slice(lang, plat)
+        }
+
+    def get_commands(self, lang, platform):
+        return self.get_command_index().get_commands(lang, platform)
+
+    def resolve_page(self, command, languages, platforms):
+        """Return the (language, platform) to show command in, or None."""
+        available = self.get_command_index().get_availability(command)
+        return pick_page(available, languages, platforms)
+
+    def get_page(self, lang_code, platform, command):
+        with instrument.timed("page.read"):
+            snapshot = self.get_snapshot()
+            available = snapshot.command_index.get_availability(command)
+            # a missing translation falls back to the English page
+            resolved = pick_page(available, [lang_code], [platform])
+
+            if resolved is not None:
+                return snapshot.page_store.get_page(available[resolved])
+
+        return f"Command '{command}' not found in '{lang_code}/{platform}'."
+
+    def get_parsed_page(self, lang_code, platform, command):
+        instrument.count("page.parsed_requests")
+        return self.load_parsed_page(
+            lang_code, platform, command, self.get_snapshot().version
+        )
+
+    @lru_cache(maxsize=256)
+    def load_parsed_page(self, lang_code, platform, command, data_version):
+        instrument.count("page.parsed_cache_misses")
+        raw_text = self.get_page(lang_code, platform, command)
+        with instrument.timed("page.parse"):
+            return parse_page(raw_text)
+
+    def search(self, query, languages, platforms, fulltext=False, limit=None):
+        """Return ranked (name, platform, language) tuples for query.
+
+        The search engine keeps its rows and name index between calls as
+        long as the languages and platforms stay the same.
+        """
+        slices = sorted(self.get_slices(languages, platforms))
+        if (
+            slices != self.search_slices
+            or self.search_engine.commands is not self.search_commands
+        ):
+            self.search_commands = [
+                (cmd, plat, lang)
+                for lang, plat in slices
+                for cmd in self.get_commands(lang, plat)
+            ]
+            self.search_engine.set_commands(self.search_commands)
+            self.search_slices = slices
+
+        rows = self.search_engine.search(query, fulltext, limit=limit)
+        commands = self.search_engine.commands
+        if rows is None:
+            rows = range(len(commands))
+
+        return [commands[row] for row in rows[:limit]]
+
+    def install_pages(self, source, verify=None):
+        """Index source into a new snapshot and start serving it.
+
+        verify is called once indexing is done, if it raises the new
+        snapshot is thrown away and the served one stays as it was.
+        """
+        # only updates need the indexer, startup does not pay for importing it
+        from .indexer import build_index
+
+        previous = self.get_snapshot()
+
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        self.remove_stale_snapshots(previous)
+        snapshot_dir = Path(tempfile.mkdtemp(dir=self.snapshots_dir)).resolve()
+
+        try:
+            diff = build_index(source, snapshot_dir, previous=previous)
+            if verify:
+                verify()
+            snapshot = DataSnapshot(snapshot_dir, previous.version + 1)
+            self.point_to(snapshot_dir)
+        except BaseException:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            raise
+
+        self.last_update_diff = diff
+        # the pointer flip, readers get either the old or the new snapshot
+        self.snapshot = snapshot
+        self.search_slices = None
+
+        if previous.path.parent == snapshot_dir.parent:
+            # deleted once the last reader lets go of it, at the latest on exit
+            weakref.finalize(previous, shutil.rmtree, previous.path, True)
+
+    def point_to(self, snapshot_dir):
+        """Make snapshot_dir the data found by the next start."""
+        link = self.cache_dir / "tldr.link"
+        link.unlink(missing_ok=True)
+        link.symlink_to(Path(self.snapshots_dir.name) / snapshot_dir.name)
+
+        if self.local_data_dir.is_dir() and not self.local_data_dir.is_symlink():
+            # a plain directory installed before there were snapshots
+            shutil.rmtree(self.local_data_dir)
+        os.replace(link, self.local_data_dir)  # atomic operation
+
+    def remove_stale_snapshots(self, served):
+        # interrupted builds, and old snapshots of processes that exited
+        # before their finalizer ran
+        keep = {served.path, self.local_data_dir.resolve()}
+        for path in self.snapshots_dir.iterdir():
+            if path.resolve() not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def process_tldr_zip(self):
+        from .indexer import ZipSource
+
+        self.install_pages(ZipSource(self.zip_path))
+        self.zip_path.unlink()
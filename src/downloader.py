@@ -0,0 +1,103 @@
+import hashlib
+import json
+
+import requests
+
+
+class ArchiveDownloader:
+    """Streams an archive with conditional requests and checksum verification.
+
+    The ETag and Last-Modified of the installed archive are kept in a
+    metadata file, so an unchanged archive costs a single request that is
+    answered with 304. The body is handed out chunk by chunk and hashed on
+    the way, nothing is written to disk here.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    TIMEOUT = 15
+
+    def __init__(self, url, meta_path, checksums_url=None, filename="tldr.zip"):
+        self.url = url
+        self.checksums_url = checksums_url
+        self.meta_path = meta_path
+        self.filename = filename
+
+        self.validators = {}
+        self.sha256 = hashlib.sha256()
+
+    def read_meta(self):
+        try:
+            return json.loads(self.meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def write_meta(self, meta):
+        self.meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+    def open(self, conditional=True):
+        """Start the request, returns None if the installed archive is current."""
+        meta = self.read_meta()
+        headers = {}
+
+        if conditional:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        r = requests.get(self.url, headers=headers, stream=True, timeout=self.TIMEOUT)
+
+        if r.status_code == 304:
+            r.close()
+            return None
+
+        try:
+            r.raise_for_status()
+        except requests.exceptions.HTTPError:
+            r.close()
+            raise
+
+        self.validators = {
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+        }
+        return r
+
+    def iter_chunks(self, response, progress_cb):
+        """Yield the body of response, progress_cb gets (downloaded, total or 0)."""
+        downloaded = 0
+        total_size = int(response.headers.get("content-length", 0))
+
+        with response:
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                if chunk:
+                    self.sha256.update(chunk)
+                    downloaded += len(chunk)
+                    progress_cb(downloaded, total_size)
+                    yield chunk
+
+    def verify_checksum(self):
+        if not self.checksums_url:
+            return
+
+        r = requests.get(self.checksums_url, timeout=self.TIMEOUT)
+        r.raise_for_status()
+
+        expected = None
+        for line in r.text.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].lstrip("*") == self.filename:
+                expected = parts[0].lower()
+
+        if expected is None:
+            raise ValueError(f"No checksum published for {self.filename}")
+
+        if self.sha256.hexdigest() != expected:
+            raise ValueError("Downloaded archive failed checksum verification")
+
+    def mark_installed(self):
+        # only remember validators once the archive was indexed, otherwise a
+        # failed update would be skipped as unchanged on the next attempt
+        meta = self.read_meta()
+        meta.update(self.validators)
+        self.write_meta(meta)
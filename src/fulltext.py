@@ -0,0 +1,110 @@
+import json
+import math
+import re
+from collections import Counter
+
+# words and command line flags, e.g. "archive", "--recursive", "-r"
+TOKEN_PATTERN = re.compile(r"-*[^\W_][\w.-]*")
+
+
+def tokenize(text):
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group(0).rstrip(".-")
+        word = token.lstrip("-")
+        if len(word) < 2 and word == token:
+            continue
+        tokens.append(token)
+        # "--recursive" should also be found by typing "recursive"
+        if word != token and len(word) > 1:
+            tokens.append(word)
+    return tokens
+
+
+def get_page_text(raw_text):
+    # title, description, example headings and code lines, see
+    # https://github.com/tldr-pages/tldr/blob/v2.3/CLIENT-SPECIFICATION.md#page-structure
+    return "\n".join(
+        line.strip()[2:] if line.strip()[:2] in ("# ", "> ", "- ") else line.strip()
+        for line in raw_text.splitlines()
+    )
+
+
+class FullTextIndexBuilder:
+    def __init__(self):
+        self.docs = []
+        self.lengths = []
+        self.postings = {}
+
+    def add_page(self, lang, platform, command, raw_text):
+        tokens = tokenize(get_page_text(raw_text))
+        self.add_terms(lang, platform, command, len(tokens), Counter(tokens))
+
+    def add_terms(self, lang, platform, command, length, term_freqs):
+        doc_id = len(self.docs)
+
+        self.docs.append([lang, platform, command])
+        self.lengths.append(length)
+
+        for term, freq in term_freqs.items():
+            self.postings.setdefault(term, []).extend((doc_id, freq))
+
+    def write(self, path):
+        path.write_text(
+            json.dumps(
+                {"docs": self.docs, "lengths": self.lengths, "terms": self.postings},
+                separators=(",", ":"),
+            ),
+            encoding="utf-8",
+        )
+
+
+class FullTextIndex:
+    # BM25 parameters
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, path):
+        data = json.loads(path.read_text(encoding="utf-8"))
+
+        self.docs = [tuple(doc) for doc in data["docs"]]
+        self.lengths = data["lengths"]
+        # postings are flat [doc_id, freq, doc_id, freq, ...] lists
+        self.terms = data["terms"]
+
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+
+    def get_doc_ids(self):
+        return {doc: doc_id for doc_id, doc in enumerate(self.docs)}
+
+    def get_doc_terms(self):
+        """Invert the postings back into a {term: freq} dict per document."""
+        doc_terms = [{} for _doc in self.docs]
+        for term, postings in self.terms.items():
+            for i in range(0, len(postings), 2):
+                doc_terms[postings[i]][term] = postings[i + 1]
+        return doc_terms
+
+    def search(self, query):
+        """Return {doc_id: bm25 score} for documents matching any query term."""
+        scores = {}
+        total = len(self.docs)
+
+        for term in set(tokenize(query)):
+            postings = self.terms.get(term)
+            if not postings:
+                continue
+
+            doc_freq = len(postings) // 2
+            idf = math.log(1 + (total - doc_freq + 0.5) / (doc_freq + 0.5))
+
+            for i in range(0, len(postings), 2):
+                doc_id, freq = postings[i], postings[i + 1]
+                norm = self.K1 * (
+                    1 - self.B + self.B * self.lengths[doc_id] / self.avg_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0) + idf * freq * (self.K1 + 1) / (
+                    freq + norm
+                )
+
+        return scores
@@ -0,0 +1,365 @@
+import json
+import os
+import struct
+import zipfile
+import zlib
+from collections import Counter, defaultdict, deque
+
+from .commandindex import write_command_index
+from .fulltext import FullTextIndexBuilder, get_page_text, tokenize
+from .pagestore import PageStoreWriter
+
+# Builds commands.bin, pages.pack, search.json and manifest.json from a
+# tldr-pages source. Used by cache updates and by generate_commands_index.py
+# at flatpak build time.
+#
+# Sources yield (language, platform, command, checksum, data) for every
+# page in the order they come across them. data is None for pages the
+# indexer already has, so a streamed archive can skip them unread. Pages are
+# written out as they arrive while tokenizing is fanned out over a process
+# pool in batches.
+
+# https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT, section 4.3.7
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+LOCAL_HEADER_MAGIC = b"PK\x03\x04"
+DESCRIPTOR_MAGIC = b"PK\x07\x08"
+
+
+def parse_member_name(name):
+    """Return (language, platform, command) for pages.<lang>/<platform>/<cmd>.md."""
+    parts = name.split("/")
+    if (
+        len(parts) != 3
+        or not parts[0].startswith("pages.")
+        or not parts[2].endswith(".md")
+    ):
+        return None
+    return parts[0].split(".", 1)[1], parts[1], parts[2][: -len(".md")]
+
+
+class ZipSource:
+    """Pages read straight out of the release archive, nothing is extracted."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def iter_pages(self, is_current):
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                key = None if info.is_dir() else parse_member_name(info.filename)
+                if key:
+                    # the archive already stores a crc32 of every member
+                    checksum = f"{info.CRC:08x}"
+                    data = None if is_current(*key, checksum) else archive.read(info)
+                    yield (*key, checksum, data)
+
+
+class TreeSource:
+    """Pages in a pages.<lang>/<platform>/*.md tree, like the tldr repository."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def iter_pages(self, is_current):
+        for lang_dir in self.root.iterdir():
+            if not (lang_dir.is_dir() and lang_dir.name.startswith("pages.")):
+                continue
+            lang = lang_dir.name.split(".", 1)[1]
+
+            for platform_dir in lang_dir.iterdir():
+                if platform_dir.is_dir():
+                    for md_file in platform_dir.glob("*.md"):
+                        data = md_file.read_bytes()
+                        yield (
+                            lang,
+                            platform_dir.name,
+                            md_file.stem,
+                            f"{zlib.crc32(data):08x}",
+                            data,
+                        )
+
+
+class ChunkReader:
+    """Reads exact byte counts from an iterator of byte chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+
+    def fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+        self.buffer += chunk
+        return True
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            if not self.fill():
+                raise EOFError("Archive ended unexpectedly")
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def read_some(self):
+        if not self.buffer and not self.fill():
+            raise EOFError("Archive ended unexpectedly")
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+    def unread(self, data):
+        self.buffer[:0] = data
+
+    def drain(self):
+        self.buffer.clear()
+        for _chunk in self.chunks:
+            pass
+
+
+class StreamSource:
+    """Pages parsed out of a zip archive while it is still being downloaded.
+
+    Members are found through their local headers, so the central directory
+    at the end of the archive is never needed and nothing touches the disk.
+    chunks is consumed to the end, a hash taken over it covers the whole
+    archive.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_pages(self, is_current):
+        reader = ChunkReader(self.chunks)
+
+        while True:
+            magic = reader.read(4)
+            if magic != LOCAL_HEADER_MAGIC:
+                # the central directory follows the last member
+                reader.drain()
+                return
+
+            (
+                _magic,
+                _version,
+                flags,
+                method,
+                _time,
+                _date,
+                crc,
+                compressed_size,
+                _size,
+                name_length,
+                extra_length,
+            ) = LOCAL_HEADER.unpack(magic + reader.read(LOCAL_HEADER.size - 4))
+            name = reader.read(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+            reader.read(extra_length)
+
+            # bit 3: crc and sizes follow the data in a descriptor
+            has_descriptor = flags & 0x08
+            if flags & 0x01:
+                raise ValueError("Encrypted archives are not supported")
+            if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) or (
+                has_descriptor and method != zipfile.ZIP_DEFLATED
+            ):
+                raise ValueError(f"Unsupported compression for {name}")
+            if compressed_size == 0xFFFFFFFF:
+                raise ValueError("Zip64 archives are not supported")
+
+            key = None if name.endswith("/") else parse_member_name(name)
+
+            if not has_descriptor and (key is None or is_current(*key, f"{crc:08x}")):
+                reader.read(compressed_size)
+                if key:
+                    yield (*key, f"{crc:08x}", None)
+                continue
+
+            if has_descriptor:
+                data = self.inflate(reader)
+                descriptor = reader.read(4)
+                if descriptor != DESCRIPTOR_MAGIC:
+                    reader.unread(descriptor)
+                crc = struct.unpack("<III", reader.read(12))[0]
+            elif method == zipfile.ZIP_DEFLATED:
+                data = zlib.decompress(reader.read(compressed_size), -15)
+            else:
+                data = reader.read(compressed_size)
+
+            if zlib.crc32(data) != crc:
+                raise ValueError(f"Bad checksum for {name} in archive")
+            if key:
+                yield (*key, f"{crc:08x}", data)
+
+    def inflate(self, reader):
+        # a deflate stream knows where it ends, the data size is not needed
+        inflater = zlib.decompressobj(-15)
+        parts = []
+        while not inflater.eof:
+            parts.append(inflater.decompress(reader.read_some()))
+        reader.unread(inflater.unused_data)
+        return b"".join(parts)
+
+
+def tokenize_pages(pages):
+    """Tokenize a batch of pages, runs in the worker processes."""
+    results = []
+    for data in pages:
+        tokens = tokenize(get_page_text(data.decode("utf-8")))
+        results.append((len(tokens), Counter(tokens)))
+    return results
+
+
+class TokenizerPool:
+    """Tokenizes pages in batches on a process pool while the caller reads on.
+
+    on_result(language, platform, command, length, term_freqs) is called in
+    the order pages were added. The pool is only started once a full batch
+    is waiting, small delta updates are tokenized inline.
+    """
+
+    BATCH_SIZE = 256
+
+    def __init__(self, workers, on_result):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.on_result = on_result
+        self.executor = None
+
+        self.keys = []
+        self.pages = []
+        # (keys, future) batches in submission order
+        self.pending = deque()
+
+    def add(self, key, data):
+        self.keys.append(key)
+        self.pages.append(data)
+        if len(self.pages) >= self.BATCH_SIZE:
+            self.submit()
+
+    def submit(self):
+        if self.executor is None and self.workers > 1:
+            # imported here, multiprocessing pulls in a good part of the
+            # standard library and only updates need it
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn instead of fork, the app calls this from a thread next to GTK
+            self.executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+        if self.executor is None:
+            self.deliver(self.keys, tokenize_pages(self.pages))
+        else:
+            self.pending.append(
+                (self.keys, self.executor.submit(tokenize_pages, self.pages))
+            )
+            # bound the pages held in memory when reading outruns the workers
+            while len(self.pending) > self.workers * 2:
+                self.collect()
+
+        self.keys = []
+        self.pages = []
+
+    def collect(self):
+        keys, future = self.pending.popleft()
+        self.deliver(keys, future.result())
+
+    def deliver(self, keys, results):
+        for key, (length, term_freqs) in zip(keys, results):
+            self.on_result(*key, length, term_freqs)
+
+    def finish(self):
+        if self.pages and self.executor is None:
+            # not worth starting the pool for less than a batch
+            self.deliver(self.keys, tokenize_pages(self.pages))
+        elif self.pages:
+            self.submit()
+        while self.pending:
+            self.collect()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+def build_index(source, output_dir, previous=None, workers=None):
+    """Index source into output_dir.
+
+    previous is the DataSnapshot currently being served. Pages whose
+    checksum is unchanged are copied from it instead of being parsed again.
+    Returns {"added", "modified", "removed"} lists of (language, platform,
+    command) keys, or None when there was no previous manifest to compare
+    against.
+    """
+    old_manifest = previous.get_manifest() if previous else {}
+    old_fulltext = previous.get_fulltext_index() if old_manifest else None
+    old_doc_ids = old_doc_terms = None
+
+    def is_current(lang, platform, command, checksum):
+        return (
+            old_fulltext is not None
+            and old_manifest.get(f"{lang}/{platform}/{command}") == checksum
+        )
+
+    commands = defaultdict(lambda: defaultdict(list))
+    manifest = {}
+    changed_keys = []
+    fulltext = FullTextIndexBuilder()
+    pages = PageStoreWriter(output_dir / "pages.pack")
+    tokenizer = TokenizerPool(workers, fulltext.add_terms)
+
+    try:
+        for lang, platform, command, checksum, data in source.iter_pages(is_current):
+            key = f"{lang}/{platform}/{command}"
+            commands[lang][platform].append(command)
+            manifest[key] = checksum
+
+            if data is None:
+                if old_doc_ids is None:
+                    old_index = previous.get_command_index()
+                    old_pages = previous.get_page_store()
+                    old_doc_ids = old_fulltext.get_doc_ids()
+                    old_doc_terms = old_fulltext.get_doc_terms()
+
+                doc_id = old_doc_ids[(lang, platform, command)]
+                data = old_pages.get_data(old_index.find(lang, platform, command))
+                fulltext.add_terms(
+                    lang,
+                    platform,
+                    command,
+                    old_fulltext.lengths[doc_id],
+                    old_doc_terms[doc_id],
+                )
+            else:
+                if not is_current(lang, platform, command, checksum):
+                    changed_keys.append(key)
+                tokenizer.add((lang, platform, command), data)
+
+            pages.add_page(lang, platform, data)
+
+        tokenizer.finish()
+    finally:
+        tokenizer.shutdown()
+
+    pages.close(commands)
+    write_command_index(output_dir / "commands.bin", commands)
+    fulltext.write(output_dir / "search.json")
+    (output_dir / "manifest.json").write_text(
+        json.dumps(manifest, separators=(",", ":")), encoding="utf-8"
+    )
+
+    if not old_manifest:
+        return None
+
+    return {
+        "added": [
+            tuple(key.split("/")) for key in changed_keys if key not in old_manifest
+        ],
+        "modified": [
+            tuple(key.split("/")) for key in changed_keys if key in old_manifest
+        ],
+        "removed": [
+            tuple(key.split("/")) for key in old_manifest if key not in manifest
+        ],
+    }
@@ -0,0 +1,114 @@
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# Opt-in timings and counters for the hot paths. Enable with
+# BRIEF_PROFILE=1 (report on stderr at exit) or BRIEF_PROFILE=/path/to/file,
+# or with the hidden "profiling" setting.
+enabled = False
+output = None
+
+timings = defaultdict(list)
+counters = defaultdict(int)
+lock = threading.Lock()
+
+
+class Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        with lock:
+            timings[self.stage].append(elapsed)
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def enable(target="-"):
+    """Start recording, the report goes to target ("-" for stderr) at exit."""
+    global enabled, output
+
+    if not enabled:
+        atexit.register(dump)
+    enabled = True
+    output = target
+
+
+def timed(stage):
+    return Timer(stage) if enabled else NULL_TIMER
+
+
+def count(name, amount=1):
+    if enabled:
+        with lock:
+            counters[name] += amount
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def histogram(values):
+    # power of two millisecond buckets: <1, <2, <4, ...
+    buckets = defaultdict(int)
+    for value in values:
+        bound = 1
+        while value >= bound:
+            bound *= 2
+        buckets[bound] += 1
+    return "  ".join(f"<{bound}ms:{n}" for bound, n in sorted(buckets.items()))
+
+
+def report():
+    with lock:
+        stages = {stage: sorted(values) for stage, values in timings.items()}
+        totals = dict(counters)
+
+    lines = ["brief profile", ""]
+    for stage, values in sorted(stages.items()):
+        lines.append(
+            f"{stage}: n={len(values)} p50={percentile(values, 0.5):.2f}ms "
+            f"p90={percentile(values, 0.9):.2f}ms p99={percentile(values, 0.99):.2f}ms "
+            f"max={values[-1]:.2f}ms total={sum(values):.1f}ms"
+        )
+        lines.append(f"    {histogram(values)}")
+
+    if totals:
+        lines.append("")
+        for name, value in sorted(totals.items()):
+            lines.append(f"{name}: {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def dump():
+    text = report()
+    if output in (None, "-", "1"):
+        sys.stderr.write(text)
+    else:
+        with open(output, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+# unset, empty and 0 all leave profiling off
+if os.environ.get("BRIEF_PROFILE", "0") not in ("", "0"):
+    enable(os.environ["BRIEF_PROFILE"])
@@ -2,7 +2,7 @@ import sys
 
 import gi
 
-from .preferences import BriefPreferencesWindow
+from . import startup
 from .window import BriefWindow
 from .tldr import PageManager
 
@@ -30,6 +30,7 @@ class BriefApplication(Adw.Application):
         if not win:
             win = BriefWindow(self.manager, application=self)
         win.present()
+        startup.mark("window presented")
 
     def on_about_action(self, *args):
         about = Adw.AboutDialog(
@@ -57,6 +58,8 @@ class BriefApplication(Adw.Application):
         about.present(self.props.active_window)
 
     def on_preferences_action(self, widget, _):
+        from .preferences import BriefPreferencesWindow
+
         pref_window = BriefPreferencesWindow(manager=self.manager)
         pref_window.present(self.props.active_window)
 
@@ -69,5 +72,6 @@ class BriefApplication(Adw.Application):
 
 
 def main(version):
+    startup.mark("modules imported")
     app = BriefApplication()
     return app.run(sys.argv)
@@ -0,0 +1,72 @@
+import mmap
+import struct
+from array import array
+
+# Layout:
+#
+#   page data   utf-8 encoded pages, back to back
+#   page table  (offset, length) uint64 pairs, in command index order
+#   footer      page table offset, page count, magic
+#
+# The table sits at the end so pages can be streamed in while indexing.
+MAGIC = b"BRIEFPAK"
+FOOTER = struct.Struct("<QQ8s")
+
+
+class PageStoreWriter:
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        # {language: {platform: [(offset, length)...]}}
+        self.spans = {}
+
+    def add_page(self, lang, platform, data):
+        offset = self.file.tell()
+        self.file.write(data)
+        self.spans.setdefault(lang, {}).setdefault(platform, []).append(
+            (offset, len(data))
+        )
+
+    def close(self, commands):
+        """Write the page table in the order of the command index for commands."""
+        table = array("Q")
+        for lang, platforms in commands.items():
+            for platform, cmd_list in platforms.items():
+                spans = self.spans[lang][platform]
+                if len(spans) != len(cmd_list):
+                    raise ValueError(f"Page count mismatch for {lang}/{platform}")
+                for span in spans:
+                    table.extend(span)
+
+        table_offset = self.file.tell()
+        self.file.write(table.tobytes())
+        self.file.write(FOOTER.pack(table_offset, len(table) // 2, MAGIC))
+        self.file.close()
+
+
+class PageStore:
+    """Serves pages out of a single memory-mapped file.
+
+    Pages are addressed by their position in the command index, see
+    CommandIndex.find.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        table_offset, count, magic = FOOTER.unpack_from(
+            self.buffer, len(self.buffer) - FOOTER.size
+        )
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a page store")
+
+        self.table = memoryview(self.buffer)[
+            table_offset : table_offset + count * 16
+        ].cast("Q")
+
+    def get_data(self, position):
+        offset, length = self.table[position * 2 : position * 2 + 2]
+        return self.buffer[offset : offset + length]
+
+    def get_page(self, position):
+        return self.get_data(position).decode("utf-8")
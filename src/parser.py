@@ -0,0 +1,97 @@
+import html
+import re
+
+# https://github.com/tldr-pages/tldr/blob/v2.3/CLIENT-SPECIFICATION.md#page-structure
+PLACEHOLDER_PATTERN = re.compile(r"\\\{\\\{|\\\}\\\}|\{\{(.*?)\}\}")
+INLINE_CODE_PATTERN = re.compile(r"`([^`]+)`")
+LINK_PATTERN = re.compile(r"&lt;(https?://[^&]+)&gt;")
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+ARG_FORMATS = ("long", "short")
+
+
+class ParsedPage:
+    """A tldr page split into blocks that can be rendered without re-parsing.
+
+    Blocks are (kind, value) tuples in page order, kind is one of "title",
+    "description" (pango markup), "example" or "code". Code blocks hold a
+    {format: text} dict with every argument format already rendered.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+
+def parse_page(raw_text):
+    blocks = []
+
+    for line in raw_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith("# "):
+            blocks.append(("title", line[2:]))
+
+        elif line.startswith("> "):
+            text_content = html.escape(line[2:])
+            text_content = INLINE_CODE_PATTERN.sub(
+                r'<span font="monospace">\1</span>', text_content
+            )
+            text_content = LINK_PATTERN.sub(r'<a href="\1">\1</a>', text_content)
+            blocks.append(("description", text_content))
+
+        elif line.startswith("- "):
+            blocks.append(("example", line[2:]))
+
+        elif line.startswith("`") and line.endswith("`"):
+            blocks.append(
+                ("code", {fmt: format_command(line[1:-1], fmt) for fmt in ARG_FORMATS})
+            )
+
+    return ParsedPage(blocks)
+
+
+def page_to_text(page, fmt):
+    """Render a parsed page as plain text for the terminal."""
+    lines = []
+
+    for kind, value in page.blocks:
+        if kind == "title":
+            lines += [value, ""]
+        elif kind == "description":
+            lines.append(html.unescape(TAG_PATTERN.sub("", value)))
+        elif kind == "example":
+            lines += ["", f"- {value}"]
+        elif kind == "code":
+            lines.append(f"    {value.get(fmt, value['long'])}")
+
+    return "\n".join(lines)
+
+
+def format_command(text, fmt):
+    def replace(match):
+        full_match = match.group(0)
+
+        if full_match == r"\{\{":
+            return "{{"
+        if full_match == r"\}\}":
+            return "}}"
+
+        content = match.group(1)
+
+        if content.startswith("[") and content.endswith("]") and "|" in content:
+            options = content[1:-1].split("|", 1)
+            short_form = options[0]
+            long_form = options[1] if len(options) > 1 else ""
+
+            if fmt == "short":
+                return short_form
+            elif fmt == "long":
+                return long_form
+            else:
+                return content
+
+        return content
+
+    return PLACEHOLDER_PATTERN.sub(replace, text)
@@ -13,6 +13,7 @@ class BriefPreferencesWindow(Adw.PreferencesDialog):
     platform_group = Gtk.Template.Child()
     language_group = Gtk.Template.Child()
     format_row = Gtk.Template.Child()
+    update_row = Gtk.Template.Child()
 
     def __init__(self, manager, **kwargs):
         super().__init__(**kwargs)
@@ -27,6 +28,13 @@ class BriefPreferencesWindow(Adw.PreferencesDialog):
             codes=["long", "short"],
         )
 
+        self.setup_interval_combo(
+            self.update_row,
+            "update-interval",
+            names=["Never", "Daily", "Weekly"],
+            days=[0, 1, 7],
+        )
+
         self.setup_expander(
             self.language_group, "languages", self.manager.get_available_languages()
         )
@@ -63,3 +71,15 @@ class BriefPreferencesWindow(Adw.PreferencesDialog):
             "notify::selected",
             lambda *_: self.settings.set_string(key, codes[row.get_selected()]),
         )
+
+    def setup_interval_combo(self, row, key, names, days):
+        row.set_model(Gtk.StringList.new(names))
+
+        current_val = self.settings.get_uint(key)
+        if current_val in days:
+            row.set_selected(days.index(current_val))
+
+        row.connect(
+            "notify::selected",
+            lambda *_: self.settings.set_uint(key, days[row.get_selected()]),
+        )
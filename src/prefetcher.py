@@ -0,0 +1,36 @@
+from collections import deque
+
+from gi.repository import GLib
+
+
+class PagePrefetcher:
+    """Parses pages that are likely to be opened next while the UI is idle.
+
+    Pages end up in the manager's parsed page cache, so opening one of them
+    afterwards renders without reading or parsing anything. Only one page is
+    handled per idle callback to keep each main loop iteration short.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.queue = deque()
+        self.source_id = None
+
+    def prefetch(self, keys):
+        """Replace the pending pages with (language, platform, command) keys."""
+        self.queue = deque(keys)
+
+        if self.queue and self.source_id is None:
+            self.source_id = GLib.idle_add(
+                self.prefetch_next, priority=GLib.PRIORITY_LOW
+            )
+
+    def prefetch_next(self):
+        if self.queue:
+            self.manager.get_parsed_page(*self.queue.popleft())
+
+        if self.queue:
+            return True
+
+        self.source_id = None
+        return False
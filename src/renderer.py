@@ -1,11 +1,11 @@
-import re
-
 import gi
 
+from . import instrument
+
 gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
 
-from gi.repository import Adw, Gdk, Gtk, GLib
+from gi.repository import Adw, Gdk, Gtk
 
 
 @Gtk.Template(resource_path="/io/github/shonebinu/Brief/renderer.ui")
@@ -20,87 +20,82 @@ class CommandPage(Adw.Bin):
 
         self.toast_overlay = toast_overlay
 
-    def display_content(self, raw_text, cmd_arg_format):
-        self.scroller.get_vadjustment().set_value(0)
+        # Widgets are kept in content_box between pages and only get new
+        # text, unused ones are hidden instead of destroyed.
+        self.widget_pools = {"title": [], "description": [], "example": [], "code": []}
 
-        child = self.content_box.get_first_child()
-        while child:
-            next_child = child.get_next_sibling()
-            self.content_box.remove(child)
-            child = next_child
-
-        lines = raw_text.splitlines()
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            if line.startswith("# "):
-                self.content_box.append(
-                    Gtk.Label(
-                        label=line[2:], xalign=0, wrap=True, css_classes=["title-1"]
-                    )
-                )
-
-            elif line.startswith("> "):
-                text_content = GLib.markup_escape_text(line[2:])
-
-                text_content = re.sub(
-                    r"`([^`]+)`",
-                    r'<span font="monospace">\1</span>',
-                    text_content,
-                )
-
-                text_content = re.sub(
-                    r"&lt;(https?://[^&]+)&gt;", r'<a href="\1">\1</a>', text_content
-                )
-                self.content_box.append(
-                    Gtk.Label(
-                        label=text_content,
-                        xalign=0,
-                        wrap=True,
-                        css_classes=["dim-label"],
-                        use_markup=True,
-                    )
-                )
-
-            elif line.startswith("- "):
-                self.content_box.append(
-                    Gtk.Label(
-                        label=line[2:],
-                        xalign=0,
-                        wrap=True,
-                        margin_top=12,
-                        css_classes=["heading"],
-                    )
-                )
-
-            elif line.startswith("`") and line.endswith("`"):
-                self.content_box.append(
-                    self.create_code_block(line[1:-1], cmd_arg_format)
-                )
-
-    def create_code_block(self, code_text, cmd_arg_format):
-        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, css_classes=["card"])
+    def display_content(self, page, cmd_arg_format):
+        with instrument.timed("render.display_content"):
+            self.update_content(page, cmd_arg_format)
 
-        scrolled = Gtk.ScrolledWindow(hexpand=True)
+    def update_content(self, page, cmd_arg_format):
+        self.scroller.get_vadjustment().set_value(0)
 
-        formatted_code = self.format_command(code_text, cmd_arg_format)
+        used = dict.fromkeys(self.widget_pools, 0)
+        previous = None
+
+        for kind, value in page.blocks:
+            pool = self.widget_pools[kind]
+            if used[kind] == len(pool):
+                widget = self.create_widget(kind)
+                instrument.count("render.widgets_created")
+                self.content_box.append(widget)
+                pool.append(widget)
+            else:
+                widget = pool[used[kind]]
+            used[kind] += 1
+
+            if kind == "code":
+                widget.code_label.set_label(value.get(cmd_arg_format, value["long"]))
+            else:
+                widget.set_label(value)
+
+            widget.set_visible(True)
+            self.content_box.reorder_child_after(widget, previous)
+            previous = widget
+
+        for kind, pool in self.widget_pools.items():
+            for widget in pool[used[kind] :]:
+                widget.set_visible(False)
+
+    def create_widget(self, kind):
+        if kind == "title":
+            return Gtk.Label(xalign=0, wrap=True, css_classes=["title-1"])
+
+        if kind == "description":
+            return Gtk.Label(
+                xalign=0,
+                wrap=True,
+                css_classes=["dim-label"],
+                use_markup=True,
+            )
 
-        scrolled.set_child(
-            Gtk.Label(
-                label=formatted_code,
+        if kind == "example":
+            return Gtk.Label(
                 xalign=0,
-                selectable=True,
-                wrap=False,
-                css_classes=["monospace"],
-                margin_top=18,
-                margin_bottom=18,
-                margin_start=18,
-                margin_end=18,
+                wrap=True,
+                margin_top=12,
+                css_classes=["heading"],
             )
+
+        return self.create_code_block()
+
+    def create_code_block(self):
+        box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, css_classes=["card"])
+
+        scrolled = Gtk.ScrolledWindow(hexpand=True)
+
+        box.code_label = Gtk.Label(
+            xalign=0,
+            selectable=True,
+            wrap=False,
+            css_classes=["monospace"],
+            margin_top=18,
+            margin_bottom=18,
+            margin_start=18,
+            margin_end=18,
         )
+        scrolled.set_child(box.code_label)
 
         btn = Gtk.Button(
             icon_name="edit-copy-symbolic",
@@ -110,7 +105,9 @@ class CommandPage(Adw.Bin):
             margin_end=6,
         )
 
-        btn.connect("clicked", lambda b: self.copy_to_clipboard(formatted_code))
+        btn.connect(
+            "clicked", lambda b: self.copy_to_clipboard(box.code_label.get_label())
+        )
 
         box.append(scrolled)
         box.append(btn)
@@ -124,33 +121,3 @@ class CommandPage(Adw.Bin):
         toast = Adw.Toast.new("Copied to clipboard")
         toast.set_timeout(3)
         self.toast_overlay.add_toast(toast)
-
-    def format_command(self, text, fmt):
-        # https://github.com/tldr-pages/tldr/blob/v2.3/CLIENT-SPECIFICATION.md#page-structure
-        pattern = r"\\\{\\\{|\\\}\\\}|\{\{(.*?)\}\}"
-
-        def replace(match):
-            full_match = match.group(0)
-
-            if full_match == r"\{\{":
-                return "{{"
-            if full_match == r"\}\}":
-                return "}}"
-
-            content = match.group(1)
-
-            if content.startswith("[") and content.endswith("]") and "|" in content:
-                options = content[1:-1].split("|", 1)
-                short_form = options[0]
-                long_form = options[1] if len(options) > 1 else ""
-
-                if fmt == "short":
-                    return short_form
-                elif fmt == "long":
-                    return long_form
-                else:
-                    return content
-
-            return content
-
-        return re.sub(pattern, replace, text)
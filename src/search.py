@@ -0,0 +1,490 @@
+import heapq
+import math
+import sys
+import threading
+import traceback
+from collections import Counter, OrderedDict, defaultdict
+from itertools import compress
+
+from . import instrument
+
+
+def get_char_keys(text):
+    # "s", "ss", ... for the first, second, ... occurrence of every character
+    return [
+        char * occurrence
+        for char, count in Counter(text).items()
+        for occurrence in range(1, count + 1)
+    ]
+
+
+class CachedQuery:
+    """Scores of one query, kept by QueryCache.
+
+    For name queries `scored` holds every name id that was scored and
+    `hits` the fuzz.ratio of those that reached MIN_SCORE, which is enough
+    to bound their score for any longer query.
+    """
+
+    def __init__(self, query, row_scores, scored=frozenset(), hits=None):
+        self.query = query
+        self.row_scores = row_scores
+        self.scored = scored
+        self.hits = hits or {}
+
+    def get_size(self):
+        return len(self.row_scores) + len(self.scored)
+
+
+class QueryCache:
+    """Recently scored queries, least recently used ones are dropped first.
+
+    Memory is bounded by the number of scores held rather than by the
+    number of queries, as every entry has one score per row.
+    """
+
+    MAX_SCORES = 1_000_000
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old.get_size()
+
+        self.entries[key] = entry
+        self.size += entry.get_size()
+
+        while self.size > self.MAX_SCORES and len(self.entries) > 1:
+            _key, old = self.entries.popitem(last=False)
+            self.size -= old.get_size()
+
+    def find_prefix(self, query):
+        """Return the cached name query that is the longest prefix of query."""
+        best = None
+        for (cached_query, fulltext), entry in self.entries.items():
+            if (
+                not fulltext
+                and len(cached_query) < len(query)
+                and query.startswith(cached_query)
+                and (best is None or len(cached_query) > len(best.query))
+            ):
+                best = entry
+        return best
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+class SearchEngine:
+    # fuzz.ratio scores below this are hidden from the results
+    MIN_SCORE = 30
+    # candidates scored between checks for a newer query
+    CHUNK_SIZE = 4096
+
+    def __init__(self, get_fulltext_index=None):
+        self.get_fulltext_index = get_fulltext_index
+
+        # guards the index against the search worker thread
+        self.lock = threading.Lock()
+        # bumped whenever the rows change so stale score vectors are dropped
+        self.version = 0
+
+        # name -> id for every distinct name ever indexed, kept across
+        # refreshes so only new names have to be added to the index
+        self.name_lookup = {}
+        self.names = []
+        # character repeated n times -> ids of the names containing it at
+        # least n times, see get_char_keys
+        self.char_index = defaultdict(set)
+
+        # (name, platform, language) for every row
+        self.commands = []
+        # row -> name id, built on the first query so startup does not pay
+        # for importing rapidfuzz and indexing every name
+        self.name_ids = None
+        # row -> full text document, looked up on the first full text query
+        self.doc_ids = None
+        # the index doc_ids belong to, a cache update brings a new one
+        self.doc_index = None
+
+        # (processed query, fulltext) -> CachedQuery, only valid for the
+        # current rows
+        self.query_cache = QueryCache()
+
+    def set_commands(self, commands):
+        # Score each distinct name once, the same command shows up for
+        # every enabled language and platform.
+        with self.lock:
+            self.commands = commands
+            self.name_ids = None
+            self.doc_ids = None
+            self.query_cache.clear()
+            self.version += 1
+
+    def splice_commands(self, removed, added):
+        """Drop the rows in removed and append the added ones after the rest.
+
+        Unlike set_commands the remaining rows keep their name ids, only
+        the added names are looked up or indexed.
+        """
+        with self.lock:
+            keep = bytearray(b"\x01") * len(self.commands)
+            for row in removed:
+                keep[row] = 0
+
+            self.commands = list(compress(self.commands, keep)) + added
+            if self.name_ids is not None:
+                from rapidfuzz import utils
+
+                self.name_ids = list(compress(self.name_ids, keep)) + [
+                    self.add_name(name, utils.default_process)
+                    for name, _plat, _lang in added
+                ]
+            # looked up again by the next full text query, on the worker
+            self.doc_ids = None
+            self.query_cache.clear()
+            self.version += 1
+
+    def restore_names(self, commands, names, processed, char_index, name_ids):
+        """Take rows together with the name index saved with them by an
+        earlier run, see warmstart.py."""
+        with self.lock:
+            self.commands = commands
+            self.doc_ids = None
+            self.query_cache.clear()
+            self.version += 1
+
+            self.name_lookup = {name: name_id for name_id, name in enumerate(names)}
+            self.names = processed
+            self.char_index = defaultdict(set, char_index)
+            self.name_ids = name_ids
+
+    def export_names(self, commands):
+        """Return (name_ids, names, processed, char_index) copies for commands.
+
+        None if the engine holds other rows by now.
+        """
+        with self.lock:
+            if commands is not self.commands:
+                return None
+
+            name_ids = list(self.get_name_ids())
+            names = [None] * len(self.names)
+            for name, name_id in self.name_lookup.items():
+                names[name_id] = name
+
+            return (
+                name_ids,
+                names,
+                list(self.names),
+                {char: list(ids) for char, ids in self.char_index.items()},
+            )
+
+    def get_name_ids(self):
+        # callers hold self.lock
+        if self.name_ids is None:
+            from rapidfuzz import utils
+
+            self.name_ids = [
+                self.add_name(name, utils.default_process)
+                for name, _plat, _lang in self.commands
+            ]
+        return self.name_ids
+
+    def add_name(self, name, processor):
+        name_id = self.name_lookup.get(name)
+        if name_id is not None:
+            return name_id
+
+        name_id = len(self.names)
+        processed = processor(name)
+
+        self.name_lookup[name] = name_id
+        self.names.append(processed)
+        for key in get_char_keys(processed):
+            self.char_index[key].add(name_id)
+
+        return name_id
+
+    def get_candidates(self, query):
+        # fuzz.ratio is 200 * m / (len(query) + len(name)) with m the longest
+        # common subsequence, and m is at most the number of characters the
+        # two share, counted with repeats. Grams longer than a character
+        # would lose transpositions such as "sl" for "ls".
+        shared = Counter()
+        for key in get_char_keys(query):
+            shared.update(self.char_index.get(key, ()))
+
+        # this also rules out names much longer or shorter than the query
+        return {
+            name_id: self.names[name_id]
+            for name_id, count in shared.items()
+            if count * 200 >= self.MIN_SCORE * (len(query) + len(self.names[name_id]))
+        }
+
+    def could_match(self, parent, name_id, name, extra):
+        """Whether name can reach MIN_SCORE for parent's query plus extra chars.
+
+        fuzz.ratio is 2 * m / (len(query) + len(name)) with m the longest
+        common subsequence, and every added character raises m by one at
+        most. Names the parent scored below MIN_SCORE had a smaller m.
+        """
+        total = len(parent.query) + len(name)
+        score = parent.hits.get(name_id)
+        if score is not None:
+            matches = score * total / 200
+        else:
+            matches = math.ceil(self.MIN_SCORE * total / 200) - 1
+
+        return 200 * (matches + extra) / (total + extra) >= self.MIN_SCORE - 1e-9
+
+    def score(self, query, fulltext=False, is_cancelled=lambda: False):
+        """Return the score vector for query, or None if it was cancelled."""
+        if not query:
+            return []
+
+        if fulltext:
+            return self.score_fulltext(query)
+
+        from rapidfuzz import fuzz, process, utils
+
+        processed = utils.default_process(query)
+
+        with self.lock, instrument.timed("search.score"):
+            # backspacing, or a change that only touched punctuation
+            cached = self.query_cache.get((processed, False))
+            if cached is not None:
+                instrument.count("search.cache_hits")
+                return cached.row_scores
+
+            name_ids = self.get_name_ids()
+            candidates = self.get_candidates(processed)
+
+            # names the previous, shorter query ruled out for good
+            parent = self.query_cache.find_prefix(processed)
+            if parent is not None:
+                extra = len(processed) - len(parent.query)
+                before = len(candidates)
+                candidates = {
+                    name_id: name
+                    for name_id, name in candidates.items()
+                    if name_id not in parent.scored
+                    or self.could_match(parent, name_id, name, extra)
+                }
+                instrument.count("search.names_pruned", before - len(candidates))
+
+            candidates = list(candidates.items())
+            instrument.count("search.names_scored", len(candidates))
+            name_scores = [-1] * len(self.names)
+            hits = {}
+
+            for start in range(0, len(candidates), self.CHUNK_SIZE):
+                if is_cancelled():
+                    return None
+
+                chunk = dict(candidates[start : start + self.CHUNK_SIZE])
+                for _name, score, name_id in process.extract(
+                    processed,
+                    chunk,
+                    scorer=fuzz.ratio,
+                    processor=None,
+                    score_cutoff=self.MIN_SCORE,
+                    limit=None,
+                ):
+                    hits[name_id] = score
+                    name_scores[name_id] = int(score * 100)
+
+            row_scores = [name_scores[name_id] for name_id in name_ids]
+            self.query_cache.put(
+                (processed, False),
+                CachedQuery(
+                    processed,
+                    row_scores,
+                    frozenset(name_id for name_id, _name in candidates),
+                    hits,
+                ),
+            )
+            return row_scores
+
+    def score_fulltext(self, query):
+        index = self.get_fulltext_index() if self.get_fulltext_index else None
+
+        with self.lock:
+            if index is None:
+                return [-1] * len(self.commands)
+
+            if self.doc_ids is None or index is not self.doc_index:
+                lookup = index.get_doc_ids()
+                self.doc_ids = [
+                    lookup.get((lang, plat, name)) for name, plat, lang in self.commands
+                ]
+                # pages may have changed while the rows stayed the same
+                if self.doc_index is not None:
+                    self.query_cache.clear()
+                self.doc_index = index
+
+            cached = self.query_cache.get((query, True))
+            if cached is not None:
+                instrument.count("search.cache_hits")
+                return cached.row_scores
+
+            with instrument.timed("search.fulltext"):
+                doc_scores = index.search(query)
+            row_scores = [doc_scores.get(doc_id, -1) for doc_id in self.doc_ids]
+            self.query_cache.put((query, True), CachedQuery(query, row_scores))
+            return row_scores
+
+    def rank(self, scores, limit=None, exclude=()):
+        """Return the matching rows, best first, ties kept in row order.
+
+        With a limit, the limit-th best score is picked out with a heap
+        first and only rows reaching it are sorted, so the cost no longer
+        grows with the number of matches. Rows in exclude are left out, so
+        the rest of a limited ranking can follow later.
+        """
+        if limit is not None and limit <= 0:
+            return []
+
+        with instrument.timed("search.rank"):
+            cutoff = 0
+            if limit is not None and len(scores) > limit:
+                cutoff = max(heapq.nlargest(limit, scores)[-1], 0)
+
+            exclude = set(exclude)
+            rows = [
+                row
+                for row, score in enumerate(scores)
+                if score >= cutoff and row not in exclude
+            ]
+            if limit is None and not exclude:
+                instrument.count("search.rows_matched", len(rows))
+
+            rows.sort(key=scores.__getitem__, reverse=True)
+            return rows[:limit]
+
+    def search(self, query, fulltext=False, is_cancelled=lambda: False, limit=None):
+        """Return the ranked rows for query, None for all rows.
+
+        Raises SearchCancelled if is_cancelled() turns true while scoring.
+        """
+        if not query:
+            return None
+
+        scores = self.score(query, fulltext, is_cancelled)
+        if scores is None:
+            raise SearchCancelled()
+        return self.rank(scores, limit)
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class SearchWorker:
+    """Ranks queries on a background thread.
+
+    Only the latest submitted query is kept, so keystrokes that arrive while
+    a query is being scored replace each other and the running one is
+    cancelled. Results are handed to `post` (GLib.idle_add in the UI) and
+    delivered to `on_result` only if nothing newer has been submitted.
+
+    With `first_results` set, only that many of the best rows go to
+    on_result and the rest of the ordering follows through `on_more`, so
+    the first screen does not wait for every match to be sorted.
+    """
+
+    def __init__(self, engine, on_result, post, on_more=None, first_results=None):
+        self.engine = engine
+        self.on_result = on_result
+        self.on_more = on_more
+        self.first_results = first_results
+        self.post = post
+
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.pending = None
+
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, query, fulltext=False):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, query, fulltext)
+            self.condition.notify()
+
+    def is_stale(self, generation):
+        return generation != self.generation
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                generation, query, fulltext = self.pending
+                self.pending = None
+
+            version = self.engine.version
+            try:
+                self.process(generation, version, query, fulltext)
+            except Exception:
+                # a broken search index must not take later queries down
+                # with it, this one just finds nothing
+                print(f"brief: search for {query!r} failed", file=sys.stderr)
+                traceback.print_exc()
+                self.post(self.deliver, generation, version, query, fulltext, [])
+
+    def process(self, generation, version, query, fulltext):
+        if not query:
+            self.post(self.deliver, generation, version, query, fulltext, None)
+            return
+
+        scores = self.engine.score(query, fulltext, lambda: self.is_stale(generation))
+        if scores is None or self.is_stale(generation):
+            return
+
+        rows = self.engine.rank(scores, self.first_results)
+        self.post(self.deliver, generation, version, query, fulltext, rows)
+
+        if self.first_results is None or len(rows) < self.first_results:
+            return
+
+        # the rest is only ranked if no newer query is waiting
+        if not self.is_stale(generation):
+            more = self.engine.rank(scores, exclude=rows)
+            if more and not self.is_stale(generation):
+                self.post(
+                    self.deliver_more, generation, version, query, fulltext, more
+                )
+
+    def deliver(self, generation, version, query, fulltext, rows):
+        # runs on the main loop, anything newer wins
+        if self.is_stale(generation):
+            return False
+
+        if version == self.engine.version:
+            self.on_result(query, fulltext, rows)
+        else:
+            # the rows changed while scoring, the result no longer lines up
+            self.submit(query, fulltext)
+        return False
+
+    def deliver_more(self, generation, version, query, fulltext, rows):
+        if self.is_stale(generation):
+            return False
+
+        if version == self.engine.version:
+            self.on_more(rows)
+        else:
+            # the rows changed after the first results went out
+            self.submit(query, fulltext)
+        return False
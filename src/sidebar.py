@@ -1,39 +1,43 @@
 import gi
 import random
-from rapidfuzz import fuzz, utils
-from functools import lru_cache
+import threading
+
+from . import instrument, startup
+from .commandlist import CommandListModel
+from .prefetcher import PagePrefetcher
+from .search import SearchWorker
+from .warmstart import get_key, read_warm_start, save_warm_start
 
 gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
 
-from gi.repository import Adw, GObject, Gtk, GLib
-
-
-class CommandItem(GObject.Object):
-    __gtype_name__ = "CommandItem"
-
-    name = GObject.Property(type=str)
-    platform = GObject.Property(type=str)
-    language = GObject.Property(type=str)
+from gi.repository import Adw, Gtk, GLib, GObject
 
-    def __init__(self, name, platform, language):
-        super().__init__()
-        self.name = name
-        self.platform = platform
-        self.language = language
+# sidebar.ui refers to CommandListModel, its type has to be registered first
+GObject.type_ensure(CommandListModel.__gtype__)
 
 
 @Gtk.Template(resource_path="/io/github/shonebinu/Brief/sidebar.ui")
 class BriefSidebar(Adw.NavigationPage):
     __gtype_name__ = "BriefSidebar"
 
+    # results parsed ahead of time after every search
+    PREFETCH_RESULTS = 5
+    # results shown before the rest of the matches are ranked, a few
+    # screens worth
+    FIRST_RESULTS = 100
+    # seconds between checks whether a background update is due
+    UPDATE_CHECK_INTERVAL = 15 * 60
+    # seconds the rows have to stay unchanged before they are saved for the
+    # next launch
+    WARM_START_DELAY = 5
+
     search_entry = Gtk.Template.Child()
+    fulltext_toggle = Gtk.Template.Child()
 
     list_view = Gtk.Template.Child()
     selection_model = Gtk.Template.Child()
-    list_store = Gtk.Template.Child()
-    sorter = Gtk.Template.Child()
-    filter = Gtk.Template.Child()
+    list_model = Gtk.Template.Child()
 
     progress_revealer = Gtk.Template.Child()
     progress_bar = Gtk.Template.Child()
@@ -46,14 +50,38 @@ class BriefSidebar(Adw.NavigationPage):
         self.load_command_page = load_command_page
         self.toast_overlay = toast_overlay
 
-        self.is_updating = False
         self.timeout_id = None
+        self.warm_start_id = None
+        self.warm_start_path = self.manager.cache_dir / "sidebar.bin"
+
+        # (name, platform, language) per row, shared by the list model and
+        # the search engine
+        self.commands = []
+        # (language, platform) pairs currently in the list
+        self.slices = set()
+
+        self.prefetcher = PagePrefetcher(self.manager)
+
+        self.search_engine = self.manager.search_engine
+        self.search_worker = SearchWorker(
+            self.search_engine,
+            self.on_search_results,
+            GLib.idle_add,
+            on_more=self.on_more_search_results,
+            first_results=self.FIRST_RESULTS,
+        )
 
-        self.process_commands()
+        # the command index is loaded after the window had a chance to
+        # draw its first frame, redraws run at a higher priority than idles
+        GLib.idle_add(self.load_commands)
+        # the first check waits until startup work is long done
+        GLib.timeout_add_seconds(30, self.on_first_update_check)
 
         self.setup_shortcuts()
 
-        self.manager.settings.connect("changed", self.refresh_data)
+        # only the language and platform lists change what is shown here
+        self.manager.settings.connect("changed::languages", self.on_slices_changed)
+        self.manager.settings.connect("changed::platforms", self.on_slices_changed)
 
     def setup_shortcuts(self):
         shortcut_controller = Gtk.ShortcutController(scope=Gtk.ShortcutScope.MANAGED)
@@ -65,51 +93,147 @@ class BriefSidebar(Adw.NavigationPage):
         shortcut_controller.add_shortcut(shortcut)
         self.add_controller(shortcut_controller)
 
+    def load_commands(self):
+        slices = self.manager.get_enabled_slices()
+        warm_start = read_warm_start(
+            self.warm_start_path, self.get_warm_start_key(slices)
+        )
+
+        if warm_start is None:
+            self.process_commands()
+        else:
+            self.restore_commands(slices, warm_start)
+
+        startup.mark("command list populated")
+        return False
+
+    def restore_commands(self, slices, warm_start):
+        # rows, their order and the name index as the last run saved them
+        self.slices = slices
+        self.commands = warm_start.get_commands()
+        self.search_engine.restore_names(
+            self.commands,
+            warm_start.name_strings,
+            warm_start.processed,
+            warm_start.char_index,
+            warm_start.name_ids,
+        )
+        self.list_model.restore(
+            warm_start.strings,
+            warm_start.names,
+            warm_start.platforms,
+            warm_start.languages,
+        )
+
+    def get_warm_start_key(self, slices):
+        return get_key(self.manager.get_snapshot().get_data_id(), slices)
+
+    def schedule_warm_start(self):
+        # a burst of preference toggles ends up as a single write
+        if self.warm_start_id is not None:
+            GLib.source_remove(self.warm_start_id)
+        self.warm_start_id = GLib.timeout_add_seconds(
+            self.WARM_START_DELAY, self.save_warm_start
+        )
+
+    def save_warm_start(self):
+        self.warm_start_id = None
+        threading.Thread(
+            target=save_warm_start,
+            args=(
+                self.warm_start_path,
+                self.get_warm_start_key(self.slices),
+                self.search_engine,
+                self.commands,
+            ),
+            daemon=True,
+        ).start()
+        return False
+
     def process_commands(self):
         commands_map = self.manager.get_all_commands()
-        command_items = [
-            CommandItem(cmd, platform, lang)
+        self.slices = {
+            (lang, platform)
+            for lang, platforms in commands_map.items()
+            for platform in platforms
+        }
+        commands = [
+            (cmd, platform, lang)
             for lang, platforms in commands_map.items()
             for platform, cmd_list in platforms.items()
             for cmd in cmd_list
         ]
 
-        random.shuffle(command_items)
+        random.shuffle(commands)
 
-        self.list_store.remove_all()
-        self.list_store.splice(0, 0, command_items)
+        self.set_commands(commands)
 
-    @lru_cache(maxsize=30000)
-    def get_fuzzy_score(self, cmd_name, search_text):
-        score = fuzz.ratio(cmd_name, search_text, processor=utils.default_process)
-        return int(score * 100)
+    def set_commands(self, commands):
+        self.commands = commands
+        self.search_engine.set_commands(commands)
 
-    @Gtk.Template.Callback()
-    def sort_commands(self, _obj, cmd_name, search_text):
-        if not search_text:
-            return 0
+        # the old order does not line up with the new rows, rather than
+        # flash every command the list stays empty until the worker ranked
+        # the current query
+        query = self.search_entry.get_text()
+        self.list_model.set_commands(commands, [] if query else None)
+        if query:
+            self.search_worker.submit(query, self.fulltext_toggle.get_active())
 
-        return self.get_fuzzy_score(cmd_name, search_text)
+        self.schedule_warm_start()
 
-    @Gtk.Template.Callback()
-    def filter_commands(self, _obj, cmd_name, search_text):
-        if not search_text:
-            return True
+    def splice_commands(self, removed, added):
+        # rows outside the changed slices keep their place and their list
+        # item, nothing is reinterned or reindexed for them
+        self.search_engine.splice_commands(removed, added)
+        self.commands = self.search_engine.commands
+        self.list_model.splice(removed, added)
+
+        # removing rows leaves the others ranked as they were, added rows
+        # only show up once the worker ranked them
+        query = self.search_entry.get_text()
+        if query and added:
+            self.search_worker.submit(query, self.fulltext_toggle.get_active())
 
-        return self.get_fuzzy_score(cmd_name, search_text) >= 30 * 100
+        self.schedule_warm_start()
 
     @Gtk.Template.Callback()
     def on_search_changed(self, *args):
-        self.filter.changed(Gtk.FilterChange.DIFFERENT)
-        self.sorter.changed(Gtk.SorterChange.DIFFERENT)
+        self.search_worker.submit(
+            self.search_entry.get_text(), self.fulltext_toggle.get_active()
+        )
+
+    def on_search_results(self, query, fulltext, rows):
+        # items-changed makes the ListView rebind its visible rows
+        with instrument.timed("sidebar.apply_results"):
+            self.list_model.set_order(rows)
         if self.selection_model.get_n_items() > 0:
             self.list_view.scroll_to(0, Gtk.ListScrollFlags.NONE, None)
 
+        self.prefetch_positions(range(self.PREFETCH_RESULTS))
+
+    def on_more_search_results(self, rows):
+        with instrument.timed("sidebar.extend_results"):
+            self.list_model.extend_order(rows)
+
+    def prefetch_positions(self, positions):
+        n_items = self.list_model.get_n_items()
+        keys = []
+        for position in positions:
+            if 0 <= position < n_items:
+                name, platform, lang = self.list_model.get_row(
+                    self.list_model.get_row_at(position)
+                )
+                keys.append((lang, platform, name))
+        self.prefetcher.prefetch(keys)
+
     @Gtk.Template.Callback()
     def on_list_item_activated(self, list_view, position):
         item = self.selection_model.get_item(position)
         if item:
             self.load_command_page(item)
+            # the neighbours are the most likely to be opened next
+            self.prefetch_positions((position + 1, position - 1))
 
     @Gtk.Template.Callback()
     def on_search_activate(self, *args):
@@ -118,20 +242,87 @@ class BriefSidebar(Adw.NavigationPage):
             if item:
                 self.selection_model.set_selected(0)
                 self.load_command_page(item)
+                self.prefetch_positions((1,))
+
+    def on_slices_changed(self, *args):
+        slices = self.manager.get_enabled_slices()
+        removed = self.slices - slices
+        added = slices - self.slices
+
+        if not removed and not added:
+            return
+
+        removed_rows = [
+            row
+            for row, (_cmd, platform, lang) in enumerate(self.commands)
+            if (lang, platform) in removed
+        ]
+        added_commands = [
+            (cmd, platform, lang)
+            for lang, platform in added
+            for cmd in self.manager.get_commands(lang, platform)
+        ]
+        random.shuffle(added_commands)
+
+        self.slices = slices
+        self.splice_commands(removed_rows, added_commands)
+        self.selection_model.set_selected(Gtk.INVALID_LIST_POSITION)
 
     def refresh_data(self, *args):
         self.process_commands()
         self.selection_model.set_selected(Gtk.INVALID_LIST_POSITION)
 
+    def apply_update_diff(self, diff):
+        if diff is None:
+            return self.refresh_data()
+
+        # a slice may have gained its first pages or lost its last ones, the
+        # added pages of a new slice are all in the diff
+        slices = self.manager.get_enabled_slices()
+        self.slices = slices
+
+        removed = {(cmd, plat, lang) for lang, plat, cmd in diff["removed"]}
+        added = [
+            (cmd, plat, lang)
+            for lang, plat, cmd in diff["added"]
+            if (lang, plat) in slices
+        ]
+
+        removed_rows = [
+            row for row, command in enumerate(self.commands) if command in removed
+        ]
+        if removed_rows or added:
+            self.splice_commands(removed_rows, added)
+
+    def on_first_update_check(self):
+        self.on_update_check()
+        GLib.timeout_add_seconds(self.UPDATE_CHECK_INTERVAL, self.on_update_check)
+        return False
+
+    def on_update_check(self):
+        if self.manager.is_update_due():
+            self.manager.update_cache(
+                None, self.on_background_update_finished, background=True
+            )
+        return True
+
+    def on_background_update_finished(self, success, message):
+        # background updates stay quiet unless pages changed
+        diff = self.manager.last_update_diff
+        if success and (diff is None or any(diff.values())):
+            self.apply_update_diff(diff)
+
+            toast = Adw.Toast.new("Pages were updated in the background")
+            toast.set_timeout(3)
+            self.toast_overlay.add_toast(toast)
+
     def start_update_process(self):
-        if self.is_updating:
+        if self.manager.updates.is_running():
             toast = Adw.Toast.new("An update process is already going on")
             toast.set_timeout(3)
             self.toast_overlay.add_toast(toast)
             return
 
-        self.is_updating = True
-
         self.progress_revealer.set_reveal_child(True)
         self.status_label.set_label("Preparing...")
 
@@ -141,6 +332,11 @@ class BriefSidebar(Adw.NavigationPage):
             progress_cb=self.on_update_progress, finished_cb=self.on_update_finished
         )
 
+    @Gtk.Template.Callback()
+    def on_cancel_update_clicked(self, *args):
+        self.status_label.set_label("Cancelling...")
+        self.manager.cancel_update()
+
     def on_update_progress(self, fraction, text):
         self.status_label.set_label(text)
         if fraction >= 0:
@@ -170,6 +366,4 @@ class BriefSidebar(Adw.NavigationPage):
         self.toast_overlay.add_toast(toast)
 
         if success:
-            self.refresh_data()
-
-        self.is_updating = False
+            self.apply_update_diff(self.manager.last_update_diff)
@@ -0,0 +1,56 @@
+import hashlib
+import json
+
+from .commandindex import CommandIndex
+from .fulltext import FullTextIndex
+from .pagestore import PageStore
+
+
+class DataSnapshot:
+    """One generation of installed data, never modified once built.
+
+    Updates build the next snapshot in a directory of its own and swap it in
+    with a single assignment, so a reader that took a snapshot keeps a
+    consistent command index, page store and search index for as long as
+    it holds on to it.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        # part of the parsed page cache key
+        self.version = version
+
+        self.command_index = CommandIndex(path / "commands.bin")
+        self.page_store = PageStore(path / "pages.pack")
+        # loaded on the first full text query
+        self.fulltext_index = None
+        self.data_id = None
+
+    def get_data_id(self):
+        # unlike version, this tells snapshots apart across runs. The rows
+        # only depend on the command index, and its content is hashed as
+        # flatpak deploys every file with the same mtime.
+        if self.data_id is None:
+            self.data_id = hashlib.sha256(self.command_index.buffer).hexdigest()
+        return self.data_id
+
+    def get_command_index(self):
+        return self.command_index
+
+    def get_page_store(self):
+        return self.page_store
+
+    def get_fulltext_index(self):
+        # two threads may both load it, either copy is fine to keep
+        if self.fulltext_index is None:
+            index_path = self.path / "search.json"
+            if index_path.exists():
+                self.fulltext_index = FullTextIndex(index_path)
+        return self.fulltext_index
+
+    def get_manifest(self):
+        # "language/platform/command" -> crc32 of the page
+        manifest_path = self.path / "manifest.json"
+        if not manifest_path.exists():
+            return {}
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
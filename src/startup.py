@@ -0,0 +1,24 @@
+import os
+import sys
+import time
+
+# Imported first thing by the launcher, so this is as close to process
+# start as Python code gets.
+START_TIME = time.perf_counter()
+
+# set BRIEF_STARTUP_REPORT=1 to print the startup milestones to stderr
+REPORT = bool(os.environ.get("BRIEF_STARTUP_REPORT"))
+
+milestones = {}
+
+
+def mark(milestone):
+    """Record the first time a startup milestone is reached."""
+    if milestone in milestones:
+        return
+
+    elapsed = (time.perf_counter() - START_TIME) * 1000
+    milestones[milestone] = elapsed
+
+    if REPORT:
+        print(f"brief: {milestone} after {elapsed:.1f} ms", file=sys.stderr)
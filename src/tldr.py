@@ -1,49 +1,43 @@
-import json
-import shutil
-import threading
+import time
 from collections import defaultdict
 from pathlib import Path
-import langcodes
-import requests
-import os
-from functools import lru_cache
 from gi.repository import Gio, GLib
 
+from . import instrument
+from .commandindex import is_command_index
+from .core import PageLibrary
+from .updater import UpdateCancelled, UpdateScheduler
 
-class PageManager:
+
+class PageManager(PageLibrary):
     TLDR_PAGES_ZIP_URL = (
         "https://github.com/tldr-pages/tldr/releases/download/v2.3/tldr.zip"
     )
+    TLDR_PAGES_CHECKSUMS_URL = (
+        "https://github.com/tldr-pages/tldr/releases/download/v2.3/tldr.sha256sums"
+    )
 
     def __init__(self):
         # /app is read-only at runtime.
         # ${FLATPAK_DEST} in flatpak manifest resolves to /app
-        self.system_data_dir = Path("/app/share/tldr/")
-        self.cache_dir = Path(GLib.get_user_cache_dir()) / "brief"
-        self.local_data_dir = self.cache_dir / "tldr"
-        self.zip_path = self.cache_dir / "tldr.zip"
+        super().__init__(
+            Path("/app/share/tldr/"), Path(GLib.get_user_cache_dir()) / "brief"
+        )
 
         self.settings = Gio.Settings.new("io.github.shonebinu.Brief")
 
-        self.is_updating = False
+        if self.settings.get_boolean("profiling"):
+            instrument.enable()
 
-    def get_data_dir(self):
-        return (
-            self.local_data_dir
-            if (self.local_data_dir / "commands.json").exists()
-            else self.system_data_dir
-        )
-
-    @lru_cache(maxsize=1)
-    def get_commands_map(self):
-        return json.loads(
-            (self.get_data_dir() / "commands.json").read_text(encoding="utf-8")
-        )
+        self.updates = UpdateScheduler(self.download_and_process_tldr_zip)
 
     def get_available_languages(self):
+        # only needed by the preferences dialog
+        import langcodes
+
         languages = [
             (langcodes.get(lang).autonym().title(), lang)
-            for lang in self.get_commands_map()
+            for lang in self.get_command_index().get_languages()
         ]
 
         languages.sort()
@@ -67,123 +61,110 @@ class PageManager:
 
         platforms = [
             (pretty_names.get(plat, plat.replace("-", " ").title()), plat)
-            for plat in self.get_commands_map().get("en", {})
+            for plat in self.get_command_index().get_platforms("en")
         ]
 
         platforms.sort()
 
         return platforms
 
+    def get_enabled_slices(self):
+        return self.get_slices(
+            self.settings.get_strv("languages"), self.settings.get_strv("platforms")
+        )
+
     def get_all_commands(self):
         commands = defaultdict(lambda: defaultdict(list))
-        enabled_langs = self.settings.get_strv("languages")
-        enabled_plats = self.settings.get_strv("platforms")
 
-        all_commands = self.get_commands_map()
-
-        for lang in enabled_langs:
-            for plat in enabled_plats:
-                if plat in all_commands.get(lang, {}):
-                    commands[lang][plat] = all_commands[lang][plat]
+        for lang, plat in self.get_enabled_slices():
+            commands[lang][plat] = self.get_commands(lang, plat)
 
         return commands
 
-    def get_page(self, lang_code, platform, command):
-        filepath = (
-            self.get_data_dir() / f"pages.{lang_code}" / platform / f"{command}.md"
-        )
+    def update_cache(self, progress_cb, finished_cb, background=False):
+        """Start an update, progress_cb may be None for background updates."""
+
+        def on_finished(success, message):
+            if success:
+                self.settings.set_int64("last-update", int(time.time()))
+            finished_cb(success, message)
 
-        if filepath.exists():
-            return filepath.read_text(encoding="utf-8")
+        if not self.updates.start(progress_cb, on_finished, background):
+            finished_cb(False, "An update process is already going on")
 
-        return f"Command '{command}' not found in path '{filepath}'."
+    def cancel_update(self):
+        self.updates.cancel()
 
-    def update_cache(self, progress_cb, finished_cb):
-        if self.is_updating:
-            return finished_cb(False, "An update process is already going on")
+    def is_update_due(self):
+        days = self.settings.get_uint("update-interval")
+        if not days or self.updates.is_running():
+            return False
+        return time.time() - self.settings.get_int64("last-update") >= days * 86400
 
-        self.is_updating = True
-        self.progress_cb = progress_cb
-        self.finished_cb = finished_cb
+    def download_and_process_tldr_zip(self, report, is_cancelled):
+        # requests is slow to import and only needed for updates
+        import requests
 
-        threading.Thread(target=self.download_and_process_tldr_zip, daemon=True).start()
+        from .downloader import ArchiveDownloader
+        from .indexer import StreamSource
+
+        self.last_update_diff = {"added": [], "modified": [], "removed": []}
+
+        def on_progress(downloaded, total_size):
+            # raised inside the download loop, which closes the connection
+            if is_cancelled():
+                raise UpdateCancelled()
+            report(*self.get_download_progress(downloaded, total_size))
+
+        def verify():
+            if is_cancelled():
+                raise UpdateCancelled()
+            downloader.verify_checksum()
 
-    def download_and_process_tldr_zip(self):
         try:
             self.cache_dir.mkdir(parents=True, exist_ok=True)
-
-            self.download_tldr_zip()
-            GLib.idle_add(self.progress_cb, -1, "Extracting...")
-            self.process_tldr_zip()
-            GLib.idle_add(self.finished_cb, True, "Cache updated successfully")
+            # left behind by interrupted downloads of older versions
+            self.cache_dir.joinpath("tldr.zip.part").unlink(missing_ok=True)
+
+            downloader = ArchiveDownloader(
+                self.TLDR_PAGES_ZIP_URL,
+                self.cache_dir / "tldr.zip.meta",
+                self.TLDR_PAGES_CHECKSUMS_URL,
+            )
+            # without a local index there is nothing the archive can match
+            response = downloader.open(
+                conditional=is_command_index(self.local_data_dir / "commands.bin")
+            )
+
+            if response is None:
+                return True, "Cache is already up to date"
+
+            # pages are indexed while the archive downloads, the checksum is
+            # checked before the new index replaces the old one
+            chunks = self.stream_archive(downloader, response, on_progress, report)
+            self.install_pages(StreamSource(chunks), verify=verify)
+            downloader.mark_installed()
+            return True, "Cache updated successfully"
+        except UpdateCancelled:
+            return False, "Update cancelled"
         except requests.exceptions.ConnectionError:
-            GLib.idle_add(self.finished_cb, False, "No network connection")
+            return False, "No network connection"
         except requests.exceptions.Timeout:
-            GLib.idle_add(self.finished_cb, False, "Connection timed out")
+            return False, "Connection timed out"
         except Exception as e:
-            GLib.idle_add(self.finished_cb, False, str(e))
-        finally:
-            self.is_updating = False
-
-    def download_tldr_zip(self):
-        with requests.get(self.TLDR_PAGES_ZIP_URL, stream=True, timeout=15) as r:
-            r.raise_for_status()
-            downloaded = 0
-            total_size = int(r.headers.get("content-length", 0))
-
-            with open(self.zip_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=64 * 1024):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-
-                        if total_size > 0:
-                            fraction = downloaded / total_size
-                            percent = int(fraction * 100)
-                            label = f"Downloading... {percent}% ({downloaded / 1024 / 1024:.1f} MB)"
-                        else:
-                            fraction = -1.0
-                            label = f"Downloading... {downloaded / 1024 / 1024:.1f} MB"
-
-                        GLib.idle_add(
-                            self.progress_cb,
-                            fraction,
-                            label,
-                        )
-
-    def process_tldr_zip(self):
-        extract_temp = self.cache_dir / "tldr.tmp"
-        shutil.rmtree(extract_temp, ignore_errors=True)
-
-        shutil.unpack_archive(self.zip_path, extract_temp)
-
-        commands = defaultdict(lambda: defaultdict(list))
-
-        for entry in extract_temp.iterdir():
-            if entry.is_dir() and entry.name.startswith("pages."):
-                lang = entry.name.split(".", 1)[1]
-
-                for platform_dir in entry.iterdir():
-                    if platform_dir.is_dir():
-                        platform = platform_dir.name
-
-                        for md_file in platform_dir.glob("*.md"):
-                            command = md_file.stem
-                            commands[lang][platform].append(command)
-            else:
-                if entry.is_dir():
-                    shutil.rmtree(entry)
-                else:
-                    entry.unlink()
-
-        (extract_temp / "commands.json").write_text(
-            json.dumps(commands, indent=2), encoding="utf-8"
-        )
-
-        shutil.rmtree(self.local_data_dir, ignore_errors=True)
-        os.replace(extract_temp, self.local_data_dir)  # atomic operation
-
-        self.zip_path.unlink()
-        shutil.rmtree(extract_temp, ignore_errors=True)
-
-        self.get_commands_map.cache_clear()
+            return False, str(e)
+
+    def stream_archive(self, downloader, response, on_progress, report):
+        yield from downloader.iter_chunks(response, on_progress)
+        report(-1, "Indexing...")
+
+    def get_download_progress(self, downloaded, total_size):
+        if total_size > 0:
+            fraction = downloaded / total_size
+            percent = int(fraction * 100)
+            label = f"Downloading... {percent}% ({downloaded / 1024 / 1024:.1f} MB)"
+        else:
+            fraction = -1.0
+            label = f"Downloading... {downloaded / 1024 / 1024:.1f} MB"
+
+        return fraction, label
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+from gi.repository import GLib
+
+
+class UpdateCancelled(Exception):
+    pass
+
+
+class ProgressThrottle:
+    """Hands progress reports from a worker thread to the main loop.
+
+    Reports are coalesced, only the latest one is kept and at most one
+    main loop source is pending, fired no more than once per INTERVAL.
+    """
+
+    INTERVAL = 0.1
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.latest = None
+        self.scheduled = False
+        self.last_sent = 0
+
+    def report(self, *args):
+        with self.lock:
+            self.latest = args
+            if self.scheduled:
+                return
+            self.scheduled = True
+
+        delay = max(0, self.last_sent + self.INTERVAL - time.monotonic())
+        GLib.timeout_add(int(delay * 1000), self.flush)
+
+    def flush(self):
+        with self.lock:
+            args = self.latest
+            self.latest = None
+            self.scheduled = False
+
+        if args is not None:
+            self.last_sent = time.monotonic()
+            self.callback(*args)
+        return False
+
+    def discard(self):
+        # a pending source still fires, but has nothing left to report
+        with self.lock:
+            self.latest = None
+
+
+class UpdateScheduler:
+    """Runs one cache update at a time on a worker thread.
+
+    run(report, is_cancelled) does the work and returns (success, message).
+    report(fraction, text) is throttled onto the main loop, finished_cb
+    runs there once the update is over and no progress report can follow
+    it. Whether an update is running only changes on the main loop.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.lock = threading.Lock()
+        # set while an update is running, cancel() sets it
+        self.cancel_event = None
+
+    def is_running(self):
+        with self.lock:
+            return self.cancel_event is not None
+
+    def start(self, progress_cb, finished_cb, background=False):
+        """Start an update, returns False if one is already running."""
+        with self.lock:
+            if self.cancel_event is not None:
+                return False
+            self.cancel_event = threading.Event()
+            cancel_event = self.cancel_event
+
+        throttle = ProgressThrottle(progress_cb) if progress_cb else None
+        threading.Thread(
+            target=self.work,
+            args=(cancel_event, throttle, finished_cb, background),
+            daemon=True,
+        ).start()
+        return True
+
+    def cancel(self):
+        with self.lock:
+            if self.cancel_event is not None:
+                self.cancel_event.set()
+
+    def work(self, cancel_event, throttle, finished_cb, background):
+        if background:
+            # nice only applies to the calling thread on Linux, and the
+            # indexing processes started from it inherit it
+            try:
+                os.nice(10)
+            except OSError:
+                pass
+
+        success, message = self.run(
+            throttle.report if throttle else lambda *args: None,
+            cancel_event.is_set,
+        )
+
+        if throttle:
+            throttle.discard()
+        GLib.idle_add(self.finish, finished_cb, success, message)
+
+    def finish(self, finished_cb, success, message):
+        with self.lock:
+            self.cancel_event = None
+        finished_cb(success, message)
+        return False
@@ -0,0 +1,156 @@
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+# A copy of the sidebar's rows and the search engine's name index as they
+# were last shown, so the next launch can skip building both.
+#
+# Layout, all integers are little endian uint32:
+#
+#   header          magic, key, row, name, character and posting counts
+#   rows            string ids of the name, platform and language columns
+#   row names       name id of every row
+#   names           string ids of the raw and the processed name per name id
+#   characters      string id and first posting of every character key, plus an end
+#   postings        name ids, grouped by character
+#   string data     utf-8 encoded strings, interned and separated by NUL
+#
+# Strings are split in one go on load instead of being decoded one by one
+# through an offset table, commands never contain a NUL.
+MAGIC = b"BRIEFWR3"
+HEADER = struct.Struct("<8s32sIIII")
+
+
+def get_key(data_id, slices):
+    """Digest of everything the rows depend on."""
+    return hashlib.sha256(repr((data_id, sorted(slices))).encode("utf-8")).digest()
+
+
+def write_warm_start(path, key, commands, name_ids, names, processed, char_index):
+    strings = {}
+
+    def intern(text):
+        return strings.setdefault(text, len(strings))
+
+    columns = [array("I") for _column in range(3)]
+    for command in commands:
+        for column, text in zip(columns, command):
+            column.append(intern(text))
+
+    name_strings = array("I", map(intern, names))
+    processed_strings = array("I", map(intern, processed))
+
+    char_table = array("I")
+    postings = array("I")
+    for char, char_names in char_index.items():
+        char_table.extend((intern(char), len(postings)))
+        postings.extend(char_names)
+    char_table.extend((0, len(postings)))
+
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                key,
+                len(commands),
+                len(names),
+                len(char_index),
+                len(postings),
+            )
+        )
+        for part in (
+            *columns,
+            array("I", name_ids),
+            name_strings,
+            processed_strings,
+            char_table,
+            postings,
+        ):
+            f.write(part.tobytes())
+        f.write("\0".join(strings).encode("utf-8"))
+    os.replace(temp_path, path)  # atomic operation
+
+
+class WarmStart:
+    """Memory-mapped reader for files written by write_warm_start.
+
+    The row columns and row names stay views into the file, only the
+    strings and the character index are turned into Python objects.
+    """
+
+    def __init__(self, buffer):
+        _magic, _key, n_rows, n_names, n_chars, n_postings = HEADER.unpack_from(
+            buffer
+        )
+        view = memoryview(buffer)
+        pos = HEADER.size
+
+        def take(count):
+            nonlocal pos
+            part = view[pos : pos + count * 4].cast("I")
+            pos += count * 4
+            return part
+
+        self.names = take(n_rows)
+        self.platforms = take(n_rows)
+        self.languages = take(n_rows)
+        self.name_ids = take(n_rows)
+        name_strings = take(n_names)
+        processed_strings = take(n_names)
+        char_table = take((n_chars + 1) * 2)
+        postings = take(n_postings).tolist()
+
+        self.strings = bytes(view[pos:]).decode("utf-8").split("\0")
+
+        self.name_strings = [self.strings[i] for i in name_strings]
+        self.processed = [self.strings[i] for i in processed_strings]
+        self.char_index = {
+            self.strings[char_table[i * 2]]: set(
+                postings[char_table[i * 2 + 1] : char_table[i * 2 + 3]]
+            )
+            for i in range(n_chars)
+        }
+
+    def get_commands(self):
+        strings = self.strings
+        return list(
+            zip(
+                map(strings.__getitem__, self.names),
+                map(strings.__getitem__, self.platforms),
+                map(strings.__getitem__, self.languages),
+            )
+        )
+
+
+def read_warm_start(path, key):
+    """Return the WarmStart at path, or None if it is missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(buffer) < HEADER.size or HEADER.unpack_from(buffer)[:2] != (MAGIC, key):
+        return None
+    return WarmStart(buffer)
+
+
+def save_warm_start(path, key, engine, commands):
+    """Write commands and the engine's name index, runs on a worker thread.
+
+    Nothing is written if the engine moved on to other rows meanwhile, a
+    newer save is on its way then.
+    """
+    exported = engine.export_names(commands)
+    if exported is None:
+        return
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_warm_start(path, key, commands, *exported)
+    except OSError:
+        # only costs the next launch its head start
+        pass
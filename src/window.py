@@ -1,7 +1,9 @@
 import gi
 
+from . import startup
+from .commandlist import CommandItem
 from .renderer import CommandPage
-from .sidebar import BriefSidebar, CommandItem
+from .sidebar import BriefSidebar
 
 gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
@@ -33,10 +35,21 @@ class BriefWindow(Adw.ApplicationWindow):
         self.command_view = CommandPage(self.toast_overlay)
         self.content_stack.add_named(self.command_view, "content")
 
-        self.manager.settings.connect("changed", self.on_settings_changed)
+        self.manager.settings.connect("changed::format", self.on_settings_changed)
 
         self.setup_actions()
 
+        self.after_paint_id = None
+        self.connect("map", self.on_map)
+
+    def on_map(self, *args):
+        frame_clock = self.get_frame_clock()
+        self.after_paint_id = frame_clock.connect("after-paint", self.on_first_frame)
+
+    def on_first_frame(self, frame_clock):
+        frame_clock.disconnect(self.after_paint_id)
+        startup.mark("first frame")
+
     def setup_actions(self):
         action = Gio.SimpleAction.new("update_cache", None)
         action.connect("activate", self.on_update_cache_action)
@@ -48,13 +61,13 @@ class BriefWindow(Adw.ApplicationWindow):
     def load_command_page(self, item: CommandItem):
         self.current_item = item
 
-        raw_text = self.manager.get_page(item.language, item.platform, item.name)
+        page = self.manager.get_parsed_page(item.language, item.platform, item.name)
 
-        if raw_text:
+        if page.blocks:
             self.navigation_page.set_title(item.name)
             self.content_stack.set_visible_child_name("content")
             self.command_view.display_content(
-                raw_text, self.manager.settings.get_string("format")
+                page, self.manager.settings.get_string("format")
             )
             self.split_view.set_show_content(True)
 
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.downloader import ArchiveDownloader
+
+ARCHIVE = b"PK archive bytes " * 1000
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    # what the stand-in serves at /tldr.sha256sums
+    checksums = ""
+    # If-None-Match headers seen at /tldr.zip
+    conditions = []
+
+    def do_GET(self):
+        if self.path == "/tldr.zip":
+            Handler.conditions.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = ARCHIVE
+            self.send_response(200)
+            self.send_header("ETag", ETAG)
+        elif self.path == "/tldr.sha256sums":
+            body = self.checksums.encode("utf-8")
+            self.send_response(200)
+        else:
+            self.send_error(404)
+            return
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.checksums = f"{hashlib.sha256(ARCHIVE).hexdigest()}  tldr.zip\n"
+    Handler.conditions = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_downloader(server, tmp_path):
+    return ArchiveDownloader(
+        f"{server}/tldr.zip",
+        tmp_path / "tldr.zip.meta",
+        checksums_url=f"{server}/tldr.sha256sums",
+    )
+
+
+def download(downloader):
+    response = downloader.open()
+    assert response is not None
+    progress = []
+    body = b"".join(
+        downloader.iter_chunks(response, lambda *args: progress.append(args))
+    )
+    assert progress[-1] == (len(ARCHIVE), len(ARCHIVE))
+    return body
+
+
+def test_unchanged_archive_is_not_downloaded_again(server, tmp_path):
+    downloader = make_downloader(server, tmp_path)
+    assert download(downloader) == ARCHIVE
+    downloader.verify_checksum()
+    downloader.mark_installed()
+
+    assert make_downloader(server, tmp_path).open() is None
+    assert Handler.conditions == [None, ETAG]
+
+    # an unconditional request always gets the archive
+    assert make_downloader(server, tmp_path).open(conditional=False) is not None
+
+
+def test_validators_are_only_saved_once_installed(server, tmp_path):
+    downloader = make_downloader(server, tmp_path)
+    download(downloader)
+    assert not downloader.meta_path.exists()
+
+    # the archive was never installed, the next attempt downloads it again
+    assert make_downloader(server, tmp_path).open() is not None
+
+    downloader.mark_installed()
+    assert downloader.read_meta()["etag"] == ETAG
+
+
+def test_checksum_mismatch_raises(server, tmp_path):
+    Handler.checksums = f"{'0' * 64}  tldr.zip\n"
+    downloader = make_downloader(server, tmp_path)
+    download(downloader)
+
+    with pytest.raises(ValueError, match="failed checksum"):
+        downloader.verify_checksum()
+
+
+def test_missing_checksum_raises(server, tmp_path):
+    Handler.checksums = f"{hashlib.sha256(ARCHIVE).hexdigest()}  other.zip\n"
+    downloader = make_downloader(server, tmp_path)
+    download(downloader)
+
+    with pytest.raises(ValueError, match="No checksum"):
+        downloader.verify_checksum()
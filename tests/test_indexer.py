@@ -0,0 +1,153 @@
+import io
+import zipfile
+import zlib
+
+import pytest
+
+from benchmarks import corpus
+from src.commandindex import CommandIndex
+from src.fulltext import FullTextIndex
+from src.indexer import StreamSource, ZipSource, build_index
+from src.pagestore import PageStore
+from src.snapshot import DataSnapshot
+
+PAGES = {
+    "pages.en/common/tar.md": "# tar\n\n> Archiving utility.\n",
+    "pages.en/linux/apt.md": "# apt\n\n> Package manager.\n" * 20,
+    "pages.de/common/tar.md": "# tar\n\n> Archivierungswerkzeug.\n",
+}
+
+
+class UnseekableFile:
+    """Forces zipfile to put sizes and crc in data descriptors."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def make_zip(compression, unseekable=False, directories=False):
+    target = UnseekableFile() if unseekable else io.BytesIO()
+    with zipfile.ZipFile(target, "w", compression) as archive:
+        if directories:
+            archive.writestr(zipfile.ZipInfo("pages.en/"), b"")
+            archive.writestr(zipfile.ZipInfo("pages.en/common/"), b"")
+        for name, text in PAGES.items():
+            archive.writestr(name, text)
+    return (target.buffer if unseekable else target).getvalue()
+
+
+def chunked(data, size=7):
+    # small chunks split headers and deflate streams at odd places
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def stream_pages(data, is_current=lambda *key: False):
+    source = StreamSource(chunked(data))
+    return {
+        f"pages.{lang}/{plat}/{cmd}.md": (checksum, page)
+        for lang, plat, cmd, checksum, page in source.iter_pages(is_current)
+    }
+
+
+def expected_pages():
+    return {
+        name: (f"{zlib.crc32(text.encode()):08x}", text.encode())
+        for name, text in PAGES.items()
+    }
+
+
+@pytest.mark.parametrize(
+    "compression, unseekable",
+    [
+        (zipfile.ZIP_STORED, False),
+        (zipfile.ZIP_DEFLATED, False),
+        (zipfile.ZIP_DEFLATED, True),
+    ],
+)
+def test_stream_source_reads_members(compression, unseekable):
+    data = make_zip(compression, unseekable)
+    if unseekable:
+        # the test is only worth something if descriptors are in use
+        assert zipfile.ZipFile(io.BytesIO(data)).infolist()[0].flag_bits & 0x08
+
+    assert stream_pages(data) == expected_pages()
+
+
+def test_stream_source_skips_directories():
+    assert stream_pages(make_zip(zipfile.ZIP_DEFLATED, directories=True)) == (
+        expected_pages()
+    )
+
+
+@pytest.mark.parametrize("compression", [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_stream_source_skips_current_pages(compression):
+    def is_current(lang, plat, cmd, checksum):
+        return cmd == "tar"
+
+    pages = stream_pages(make_zip(compression), is_current)
+    expected = expected_pages()
+
+    assert pages.keys() == expected.keys()
+    for name, (checksum, page) in pages.items():
+        assert checksum == expected[name][0]
+        assert page == (None if "tar" in name else expected[name][1])
+
+
+def test_stream_source_rejects_bad_checksum():
+    data = make_zip(zipfile.ZIP_STORED)
+    data = data.replace(b"Package manager", b"Package mangler", 1)
+
+    with pytest.raises(ValueError, match="Bad checksum"):
+        stream_pages(data)
+
+
+def read_index(path):
+    index = CommandIndex(path / "commands.bin")
+    store = PageStore(path / "pages.pack")
+    fulltext = FullTextIndex(path / "search.json")
+
+    pages = {
+        (lang, plat, cmd): store.get_data(index.find(lang, plat, cmd))
+        for lang in index.get_languages()
+        for plat in index.get_platforms(lang)
+        for cmd in index.get_commands(lang, plat)
+    }
+    doc_ids = fulltext.get_doc_ids()
+    doc_terms = fulltext.get_doc_terms()
+    postings = {
+        doc: (fulltext.lengths[doc_id], doc_terms[doc_id])
+        for doc, doc_id in doc_ids.items()
+    }
+    return pages, postings
+
+
+def test_delta_build_matches_fresh_build(tmp_path):
+    corpus_args = {"commands": 300, "languages": 2, "seed": 4}
+    old_zip = corpus.write_zip(tmp_path / "old.zip", **corpus_args)
+    new_zip = corpus.write_zip(tmp_path / "new.zip", modified=0.1, **corpus_args)
+
+    for name in ("old", "delta", "fresh"):
+        (tmp_path / name).mkdir()
+
+    assert build_index(ZipSource(old_zip), tmp_path / "old", workers=1) is None
+    previous = DataSnapshot(tmp_path / "old", 0)
+
+    with open(new_zip, "rb") as f:
+        diff = build_index(
+            StreamSource(chunked(f.read(), 4096)),
+            tmp_path / "delta",
+            previous=previous,
+            workers=1,
+        )
+    build_index(ZipSource(new_zip), tmp_path / "fresh", workers=1)
+
+    # most pages were copied from the previous snapshot
+    assert 0 < len(diff["modified"]) < len(previous.get_manifest()) / 2
+    assert not diff["added"] and not diff["removed"]
+    assert read_index(tmp_path / "delta") == read_index(tmp_path / "fresh")
@@ -0,0 +1,146 @@
+import queue
+import random
+import string
+
+from rapidfuzz import fuzz, utils
+
+from benchmarks.corpus import make_command_name
+from src.search import SearchEngine, SearchWorker
+
+
+def brute_force(names, query):
+    processed = utils.default_process(query)
+    scores = [fuzz.ratio(processed, utils.default_process(name)) for name in names]
+    return {
+        row
+        for row, score in enumerate(scores)
+        if score >= SearchEngine.MIN_SCORE and processed
+    }
+
+
+def search(names, query):
+    engine = SearchEngine()
+    engine.set_commands([(name, "common", "en") for name in names])
+    return set(engine.search(query))
+
+
+def make_names(rng, count):
+    alphabet = string.ascii_lowercase + "-"
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+        for _ in range(count)
+    ]
+
+
+def test_transposed_queries_keep_matches():
+    names = ["df", "rm", "cp", "ls", "tar", "git", "grep"]
+    for query, expected in [("fd", "df"), ("mr", "rm"), ("pc", "cp"), ("sl", "ls")]:
+        rows = search(names, query)
+        assert names.index(expected) in rows
+        assert rows == brute_force(names, query)
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    names = make_names(rng, 3000)
+
+    queries = []
+    for name in rng.sample(names, 100):
+        chars = list(name)
+        i = rng.randrange(len(chars))
+        typo = chars.copy()
+        typo[i] = rng.choice(string.ascii_lowercase)
+        queries.append("".join(typo))
+        if len(chars) > 1:
+            j = rng.randrange(len(chars) - 1)
+            chars[j], chars[j + 1] = chars[j + 1], chars[j]
+        queries.append("".join(chars))
+        queries.append(name[::-1])
+
+    for query in queries:
+        assert search(names, query) == brute_force(names, query), query
+
+
+def test_cached_prefixes_match_brute_force():
+    # extending and shortening queries goes through the query cache
+    rng = random.Random(1)
+    names = make_names(rng, 2000)
+    engine = SearchEngine()
+    engine.set_commands([(name, "common", "en") for name in names])
+
+    for name in rng.sample(names, 20):
+        query = name[::-1]
+        for end in [*range(1, len(query) + 1), *range(len(query) - 1, 0, -1)]:
+            rows = set(engine.search(query[:end]))
+            assert rows == brute_force(names, query[:end]), query[:end]
+
+
+def test_splice_matches_set_commands():
+    rng = random.Random(2)
+    commands = [
+        (name, rng.choice(["common", "linux"]), "en") for name in make_names(rng, 500)
+    ]
+    added = [(name, "osx", "en") for name in make_names(rng, 100)]
+    removed = [row for row, command in enumerate(commands) if command[1] == "linux"]
+
+    spliced = SearchEngine()
+    spliced.set_commands(commands)
+    spliced.search("ab")
+    spliced.splice_commands(removed, added)
+
+    rebuilt = SearchEngine()
+    rebuilt.set_commands(spliced.commands)
+    assert spliced.commands == [
+        command for command in commands if command[1] != "linux"
+    ] + added
+
+    for query in ["ab", "xyz", "q-r", "linux"]:
+        assert spliced.search(query) == rebuilt.search(query)
+
+
+def test_candidates_narrow_the_corpus():
+    rng = random.Random(3)
+    names = set()
+    while len(names) < 6000:
+        names.add(make_command_name(rng))
+    names = sorted(names)
+    engine = SearchEngine()
+    engine.set_commands([(name, "common", "en") for name in names])
+    engine.search("x")
+
+    # a name sharing a single character with the query is no candidate, the
+    # cost follows the number of matches rather than the corpus size
+    for query in ["ls", "git", "sed", "tar", "grep", "systemctl"]:
+        candidates = engine.get_candidates(query)
+        matches = {engine.get_name_ids()[row] for row in engine.search(query)}
+        assert matches <= candidates.keys()
+        assert len(candidates) < 2.5 * len(matches), query
+
+    assert len(engine.get_candidates("git")) < len(names) / 5
+
+
+def test_worker_survives_a_failing_query():
+    def load_broken_index():
+        raise ValueError("truncated search.json")
+
+    engine = SearchEngine(load_broken_index)
+    engine.set_commands([("tar", "common", "en"), ("git", "common", "en")])
+
+    results = queue.Queue()
+    worker = SearchWorker(
+        engine, lambda *result: results.put(result), lambda func, *args: func(*args)
+    )
+
+    worker.submit("tar", fulltext=True)
+    assert results.get(timeout=5) == ("tar", True, [])
+    worker.submit("tar")
+    assert results.get(timeout=5)[2][0] == 0
+
+
+def test_rank_limits():
+    engine = SearchEngine()
+    scores = [50, -1, 80, 30, 80]
+    assert engine.rank(scores) == [2, 4, 0, 3]
+    assert engine.rank(scores, 2) == [2, 4]
+    assert engine.rank(scores, 0) == []
+    assert engine.rank(scores, -1) == []
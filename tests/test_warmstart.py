@@ -0,0 +1,34 @@
+import os
+
+from src.commandindex import write_command_index
+from src.pagestore import PageStoreWriter
+from src.snapshot import DataSnapshot
+from src.warmstart import get_key
+
+
+def make_snapshot(path, commands):
+    path.mkdir()
+    index = {"en": {"common": commands}}
+    pages = PageStoreWriter(path / "pages.pack")
+    for command in commands:
+        pages.add_page("en", "common", f"# {command}\n".encode())
+    pages.close(index)
+    write_command_index(path / "commands.bin", index)
+    # flatpak deploys every file with the same mtime
+    os.utime(path / "commands.bin", ns=(0, 0))
+    return DataSnapshot(path, 0)
+
+
+def test_key_follows_command_index_content(tmp_path):
+    slices = {("en", "common")}
+    old = make_snapshot(tmp_path / "old", ["tar", "git"])
+    renamed = make_snapshot(tmp_path / "renamed", ["tar", "gut"])
+    same = make_snapshot(tmp_path / "same", ["tar", "git"])
+
+    assert (old.path / "commands.bin").stat().st_size == (
+        renamed.path / "commands.bin"
+    ).stat().st_size
+    assert get_key(old.get_data_id(), slices) != get_key(
+        renamed.get_data_id(), slices
+    )
+    assert get_key(old.get_data_id(), slices) == get_key(same.get_data_id(), slices)